@@ -3,5 +3,6 @@ from __future__ import absolute_import, unicode_literals
 # This will make sure the app is always imported when
 # Django starts so that shared_task will use this app.
 from .celery import app as celery_app
+from . import checks  # noqa: registers the system checks
 
 __all__ = ['celery_app']
\ No newline at end of file
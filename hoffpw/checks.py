@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Backends whose data is private to one process.
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def get_shared_cache_aliases():
+    """
+    Returns (setting, alias) of every cache alias that has to be shared between processes.
+    """
+    from twitch_stats import settings as twitch_settings
+    from webauth import settings as webauth_settings
+    return [
+        ('TWITCH_STATS_CACHE', twitch_settings.TWITCH_STATS_CACHE),
+        ('TWITCH_VERIFY_CACHE', twitch_settings.TWITCH_VERIFY_CACHE),
+        ('TWITCH_DIRECTORY_CACHE', twitch_settings.TWITCH_DIRECTORY_CACHE),
+        ('TOKEN_CACHE_ALIAS', webauth_settings.TOKEN_CACHE_ALIAS),
+        # Replica stickiness after writes is kept in the default cache.
+        ('DATABASE_REPLICAS', 'default' if settings.DATABASE_REPLICAS else None),
+    ]
+
+
+@register('caches')
+def check_shared_caches(app_configs, **kwargs):
+    errors = []
+    for setting, alias in get_shared_cache_aliases():
+        if alias is None:
+            continue
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend is None:
+            errors.append(Error("{} refers to the unknown cache alias '{}'.".format(setting, alias),
+                                id='hoffpw.E001'))
+        elif backend in LOCAL_BACKENDS:
+            errors.append(Error("{} uses the cache '{}', which is not shared between processes."
+                                .format(setting, alias),
+                                hint='Configure a shared backend such as memcached or the database cache.',
+                                id='hoffpw.E002'))
+    return errors
@@ -0,0 +1,139 @@
+"""
+PostgreSQL backend that shares a bounded pool of connections per process.
+
+Under gevent and eventlet every greenlet gets its own Django connection, so
+persistent connections are never reused and plain connections are opened per
+request. With this backend closing a connection returns it to the pool, and
+opening one takes an idle connection from the pool, waiting when MAX_CONNS are
+already in use. The `threading` primitives are cooperative once monkey patched.
+"""
+import threading
+import time
+
+from django.db import OperationalError
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from psycopg2 import extensions
+
+POOL_OPTIONS = {
+    'MAX_CONNS': 10,
+    'POOL_TIMEOUT': 30,
+    'HEALTH_CHECK_AFTER': 30,
+    'MAX_LIFETIME': 3600,
+}
+
+
+class ConnectionPool(object):
+    def __init__(self, max_conns, timeout, health_check_after, max_lifetime):
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self._semaphore = threading.BoundedSemaphore(max_conns)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._opened = {}
+
+    def get(self, connect):
+        if not self._semaphore.acquire(timeout=self.timeout):
+            raise OperationalError('No database connection available within {}s, raise MAX_CONNS.'
+                                   .format(self.timeout))
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection, returned = self._idle.pop()
+                    opened = self._opened.get(id(connection))
+                if self._is_healthy(connection, opened, returned):
+                    return connection
+                self._discard(connection)
+            connection = connect()
+            with self._lock:
+                self._opened[id(connection)] = time.monotonic()
+            return connection
+        except Exception:
+            self._semaphore.release()
+            raise
+
+    def put(self, connection):
+        try:
+            if connection.closed:
+                self._discard(connection)
+                return
+            if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        except Exception:
+            self._discard(connection)
+        finally:
+            self._semaphore.release()
+
+    def discard(self, connection):
+        """
+        Closes a checked out connection instead of returning it.
+        """
+        try:
+            self._discard(connection)
+        finally:
+            self._semaphore.release()
+
+    def _is_healthy(self, connection, opened, returned):
+        now = time.monotonic()
+        if connection.closed or opened is None or now - opened > self.max_lifetime:
+            return False
+        if now - returned < self.health_check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        with self._lock:
+            self._opened.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    @property
+    def pool(self):
+        with _pools_lock:
+            if self.alias not in _pools:
+                options = self.settings_dict['OPTIONS']
+                _pools[self.alias] = ConnectionPool(
+                    max_conns=options.get('MAX_CONNS', POOL_OPTIONS['MAX_CONNS']),
+                    timeout=options.get('POOL_TIMEOUT', POOL_OPTIONS['POOL_TIMEOUT']),
+                    health_check_after=options.get('HEALTH_CHECK_AFTER', POOL_OPTIONS['HEALTH_CHECK_AFTER']),
+                    max_lifetime=options.get('MAX_LIFETIME', POOL_OPTIONS['MAX_LIFETIME']),
+                )
+            return _pools[self.alias]
+
+    def get_connection_params(self):
+        conn_params = super(DatabaseWrapper, self).get_connection_params()
+        for option in POOL_OPTIONS:
+            conn_params.pop(option, None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        parent = super(DatabaseWrapper, self)
+        return self.pool.get(lambda: parent.get_new_connection(conn_params))
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block:
+            # Django keeps self.connection after a close inside atomic(), so it
+            # must not be handed to another greenlet. It is closed for good.
+            self.pool.discard(self.connection)
+        else:
+            self.pool.put(self.connection)
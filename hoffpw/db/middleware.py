@@ -0,0 +1,40 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from hoffpw.db.routers import set_replica_reads
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware(object):
+    """
+    Allows replica reads for safe requests. After a client address sends a
+    write, its reads stay on the primary for DATABASE_REPLICA_STICKY_SECONDS
+    so it reads its own writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        sticky_key = self.get_sticky_key(request)
+        safe = request.method in SAFE_METHODS
+        set_replica_reads(safe and not cache.get(sticky_key))
+        try:
+            response = self.get_response(request)
+        finally:
+            set_replica_reads(False)
+        if not safe:
+            cache.set(sticky_key, True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+        return response
+
+    @staticmethod
+    def get_sticky_key(request):
+        # Always the client address: a login is written without a token and
+        # followed by requests with one, both have to share the key.
+        client = request.META.get('HTTP_X_FORWARDED_FOR', request.META.get('REMOTE_ADDR', '')).split(',')[0].strip()
+        return 'hoffpw:db-sticky:{}'.format(hashlib.sha256(client.encode('utf-8')).hexdigest())
@@ -0,0 +1,41 @@
+import random
+import threading
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+def set_replica_reads(enabled):
+    """
+    Allows or forbids replica reads for the current thread/greenlet.
+    """
+    _state.replica_reads = enabled
+
+
+class ReplicaRouter(object):
+    """
+    Sends reads of the routed apps to a random replica while the current
+    request allows it (safe method and no recent write by the same client).
+    Everything else, writes and work outside requests such as stats
+    collection, stays on the primary.
+    """
+    route_app_labels = ('twitch_stats', 'webauth')
+    # Tokens are read right after login, a lagging replica would reject them.
+    primary_models = ('webauth.authtoken',)
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not getattr(_state, 'replica_reads', False):
+            return None
+        if model._meta.app_label not in self.route_app_labels or model._meta.label_lower in self.primary_models:
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -68,6 +68,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'hoffpw.db.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -125,6 +126,24 @@ DATABASES = {
 }
 
 
+# Caches
+# The default cache is shared by every web and worker process: it holds state
+# that must be the same everywhere, like channel versions and verification locks.
+# CACHE_BACKEND/CACHE_LOCATION point it to e.g. memcached, by default it is the
+# database table created by `createcachetable`. hoffpw.checks refuses
+# process-local backends for the shared aliases.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'hoffpw_cache'),
+    }
+}
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache':
+    # The database cache culls a third of its rows past MAX_ENTRIES (300 by default),
+    # which would drop channel versions and verification locks.
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 100000))}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
 
@@ -147,6 +166,26 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# The first hasher hashes new passwords, the rest can still verify old hashes
+# which are upgraded on the next login. PASSWORD_HASHER selects the preferred one
+# ('bcrypt' needs the bcrypt package installed).
+PASSWORD_HASHER_CHOICES = {
+    'argon2': 'webauth.hashers.TunedArgon2PasswordHasher',
+    'bcrypt': 'webauth.hashers.TunedBCryptSHA256PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [
+    'webauth.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'webauth.hashers.TunedBCryptSHA256PasswordHasher',
+]
+_preferred_hasher = PASSWORD_HASHER_CHOICES[os.environ.get('PASSWORD_HASHER', 'argon2')]
+PASSWORD_HASHERS.remove(_preferred_hasher)
+PASSWORD_HASHERS.insert(0, _preferred_hasher)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.10/topics/i18n/
 
@@ -175,15 +214,47 @@ STATIC_URL = '/static/'
 
 AUTH_USER_MODEL = 'webauth.User'
 
+# EmailOrUsernameModelBackend already covers ModelBackend, listing both would hash twice on a failed login.
 AUTHENTICATION_BACKENDS = [
     'webauth.backends.EmailOrUsernameModelBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Database connection handling, DATABASE_POOL_MODE is one of:
+# 'none'       - a new connection for every request and task.
+# 'persistent' - Django keeps a connection per thread/greenlet for DATABASE_CONN_MAX_AGE seconds.
+# 'pool'       - connections are shared through a bounded per-process pool (Postgres only).
+# 'pgbouncer'  - same as 'none' on the Django side, pooling is left to the external pooler that
+#                DATABASE_URL points to. Only documents the deployment, it changes nothing here.
+DATABASE_POOL_MODE = os.environ.get('DATABASE_POOL_MODE', 'none')
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)) if DATABASE_POOL_MODE == 'persistent' else 0
+
 # Update database configuration with $DATABASE_URL.
-db_from_env = dj_database_url.config(conn_max_age=0)
+db_from_env = dj_database_url.config(conn_max_age=DATABASE_CONN_MAX_AGE)
 DATABASES['default'].update(db_from_env)
 
+# Read replicas from $DATABASE_REPLICA_URLS (comma separated), used for reads
+# of safe requests by hoffpw.db.routers.ReplicaRouter. Stickiness after writes
+# is tracked in the default cache, hoffpw.checks refuses replicas when that
+# cache is not shared between dynos.
+DATABASE_REPLICAS = []
+for index, replica_url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    alias = 'replica{}'.format(index)
+    DATABASES[alias] = dj_database_url.parse(replica_url, conn_max_age=DATABASE_CONN_MAX_AGE)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS', 10))
+DATABASE_ROUTERS = ['hoffpw.db.routers.ReplicaRouter']
+
+if DATABASE_POOL_MODE == 'pool':
+    for database in DATABASES.values():
+        if 'postgresql' in database['ENGINE']:
+            database['ENGINE'] = 'hoffpw.db.backends.postgresql_pool'
+            database.setdefault('OPTIONS', {}).update({
+                'MAX_CONNS': int(os.environ.get('DATABASE_POOL_SIZE', 10)),
+                'POOL_TIMEOUT': int(os.environ.get('DATABASE_POOL_TIMEOUT', 30)),
+                'HEALTH_CHECK_AFTER': int(os.environ.get('DATABASE_POOL_HEALTH_CHECK_AFTER', 30)),
+            })
+
 SECRET_KEY = os.environ.get('SECRET_KEY', '')
 
 try:
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from psycopg2 import extensions
+
+from hoffpw.db import routers
+from hoffpw.db.backends.postgresql_pool.base import ConnectionPool, DatabaseWrapper
+from hoffpw.db.middleware import ReplicaRoutingMiddleware
+from twitch_stats.models import TwitchStats
+from webauth.models import AuthToken
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'], DATABASE_REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.routed = []
+        self.middleware = ReplicaRoutingMiddleware(self.get_response)
+
+    def get_response(self, request):
+        router = routers.ReplicaRouter()
+        self.routed.append((router.db_for_read(TwitchStats), router.db_for_read(AuthToken)))
+        return HttpResponse()
+
+    def test_safe_and_unsafe_methods(self):
+        """
+        Ensure safe requests read routed models from a replica and writes stay on the primary.
+        """
+        self.middleware(self.factory.get('/'))
+        self.middleware(self.factory.post('/'))
+        self.assertEqual(self.routed, [('replica0', None), (None, None)])
+        self.assertIsNone(routers.ReplicaRouter().db_for_read(TwitchStats))
+
+    def test_sticky_after_login(self):
+        """
+        Ensure reads with a new token stay on the primary after a write sent without one.
+        """
+        self.middleware(self.factory.post('/auth/login/'))
+        self.middleware(self.factory.get('/', HTTP_AUTHORIZATION='Token new'))
+        self.middleware(self.factory.get('/', REMOTE_ADDR='10.0.0.2'))
+        self.assertEqual([db for db, token_db in self.routed], [None, None, 'replica0'])
+
+    def test_sticky_window(self):
+        """
+        Ensure reads go back to the replicas once the sticky window ends.
+        """
+        self.middleware(self.factory.post('/'))
+        later = timezone.now() + timedelta(seconds=11)
+        with mock.patch('django.core.cache.backends.db.timezone.now', return_value=later):
+            self.middleware(self.factory.get('/'))
+        self.assertEqual([db for db, token_db in self.routed], [None, 'replica0'])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """
+        Ensure everything is read from the primary and nothing is cached without replicas.
+        """
+        with self.assertNumQueries(0):
+            self.middleware(self.factory.post('/'))
+            self.middleware(self.factory.get('/'))
+        self.assertEqual(self.routed, [(None, None), (None, None)])
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(max_conns=2, timeout=0.01, health_check_after=30, max_lifetime=3600)
+        self.connect = mock.Mock(side_effect=self.make_connection)
+
+    @staticmethod
+    def make_connection():
+        connection = mock.MagicMock(closed=False)
+        connection.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+        return connection
+
+    def test_checkout_and_return(self):
+        """
+        Ensure returned connections are reused and open transactions are rolled back on return.
+        """
+        first = self.pool.get(self.connect)
+        first.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+        self.pool.put(first)
+        first.rollback.assert_called_once_with()
+        self.assertIs(self.pool.get(self.connect), first)
+        self.assertEqual(self.connect.call_count, 1)
+
+    def test_exhausted(self):
+        """
+        Ensure checking out past MAX_CONNS fails with OperationalError after POOL_TIMEOUT.
+        """
+        first = self.pool.get(self.connect)
+        self.pool.get(self.connect)
+        with self.assertRaises(OperationalError):
+            self.pool.get(self.connect)
+        self.pool.put(first)
+        self.assertIs(self.pool.get(self.connect), first)
+
+    def test_health_check(self):
+        """
+        Ensure connections idle for longer than HEALTH_CHECK_AFTER are checked and broken ones replaced.
+        """
+        with mock.patch('hoffpw.db.backends.postgresql_pool.base.time.monotonic', return_value=0):
+            healthy, broken = self.pool.get(self.connect), self.pool.get(self.connect)
+            broken.cursor.side_effect = Exception('server closed the connection')
+            self.pool.put(healthy)
+            self.pool.put(broken)
+        with mock.patch('hoffpw.db.backends.postgresql_pool.base.time.monotonic', return_value=60):
+            # The broken connection is checked first, discarded, and the healthy one handed out.
+            self.assertIs(self.pool.get(self.connect), healthy)
+            self.assertNotIn(self.pool.get(self.connect), (healthy, broken))
+        broken.close.assert_called_once_with()
+        healthy.cursor.return_value.__enter__.return_value.execute.assert_called_once_with('SELECT 1')
+
+    def test_close_in_atomic_block(self):
+        """
+        Ensure a connection closed inside atomic() is discarded, not shared through the pool.
+        """
+        wrapper = DatabaseWrapper({'NAME': 'test', 'OPTIONS': {}, 'USER': '', 'PASSWORD': '', 'HOST': '',
+                                   'PORT': '', 'CONN_MAX_AGE': 0, 'AUTOCOMMIT': True, 'TIME_ZONE': None},
+                                  alias='pool_test')
+        with mock.patch('hoffpw.db.backends.postgresql_pool.base._pools', {'pool_test': self.pool}):
+            wrapper.connection = self.pool.get(self.connect)
+            connection = wrapper.connection
+            wrapper.in_atomic_block = True
+            wrapper.close()
+            self.assertIs(wrapper.connection, connection)
+            connection.close.assert_called_once_with()
+            self.assertIsNot(self.pool.get(self.connect), connection)
+            self.pool.get(self.connect)
@@ -0,0 +1,32 @@
+"""
+    Per channel versions used to cache stats responses.
+
+    A channel's version is the time its stats last changed. It is bumped by
+    the collector and the rollup task, which invalidates every cached
+    response of the channel at once. TWITCH_STATS_CACHE is shared between
+    the workers and the web processes, see hoffpw.checks.
+"""
+import time
+
+from django.core.cache import caches
+
+from .settings import TWITCH_STATS_CACHE
+
+VERSION_KEY = 'twitch_stats:channel-version:{}'
+
+
+def get_channel_version(channel_id):
+    cache = caches[TWITCH_STATS_CACHE]
+    key = VERSION_KEY.format(channel_id)
+    version = cache.get(key)
+    if version is None:
+        # Unknown after a cache flush, start a new version from now.
+        cache.add(key, time.time(), timeout=None)
+        version = cache.get(key, time.time())
+    return version
+
+
+def touch_channels(channel_ids):
+    now = time.time()
+    caches[TWITCH_STATS_CACHE].set_many({VERSION_KEY.format(channel_id): now for channel_id in set(channel_ids)},
+                                        timeout=None)
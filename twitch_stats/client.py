@@ -0,0 +1,93 @@
+"""
+    Shared HTTP client for Twitch API calls.
+"""
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ratelimit import RateLimiter
+from .settings import TWITCH_CLIENT_ID, TWITCH_VERSION_HEADERS, TWITCH_API_POOL_SIZE, TWITCH_API_TIMEOUT, \
+    TWITCH_API_MAX_RETRIES, TWITCH_STREAMS_BATCH_SIZE
+
+TWITCH_API_URL = "https://api.twitch.tv/kraken/"
+TWITCH_HELIX_URL = "https://api.twitch.tv/helix/"
+TWITCH_USERS_BATCH_SIZE = 100
+
+
+class TwitchClient(object):
+    """
+    Keep-alive client backed by a pooled requests.Session, so calls reuse
+    already established connections to api.twitch.tv. Every call goes through
+    the shared rate limiter and throttled calls are retried after the reset.
+    """
+
+    def __init__(self, pool_size=TWITCH_API_POOL_SIZE, timeout=TWITCH_API_TIMEOUT, max_retries=TWITCH_API_MAX_RETRIES):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limiter = RateLimiter()
+        self.session = requests.Session()
+        self.session.headers.update({'Accept': TWITCH_VERSION_HEADERS, 'Client-ID': TWITCH_CLIENT_ID})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        url = path if path.startswith('https://') else TWITCH_API_URL + path
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            r = self.session.request(method, url, **kwargs)
+            if not self.limiter.update(r):
+                break
+        return r
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def get_streams(self, channel_ids):
+        """
+        Returns live streams for up to TWITCH_STREAMS_BATCH_SIZE channels.
+        """
+        params = {'channel': ','.join(channel_ids), 'limit': TWITCH_STREAMS_BATCH_SIZE}
+        r = self.get('streams/', params=params)
+        r.raise_for_status()
+        return r.json().get('streams') or []
+
+    def get_users(self, user_ids):
+        """
+        Returns {id: name} of the existing users among up to TWITCH_USERS_BATCH_SIZE ids.
+        Kraken only looks users up by login in bulk, so this uses the helix endpoint.
+        """
+        r = self.get(TWITCH_HELIX_URL + 'users', params=[('id', user_id) for user_id in user_ids])
+        r.raise_for_status()
+        return {user['id']: user['login'] for user in r.json().get('data') or []}
+
+    def get_users_by_login(self, logins):
+        """
+        Returns {name: id} of the existing users among up to TWITCH_USERS_BATCH_SIZE names.
+        """
+        r = self.get(TWITCH_HELIX_URL + 'users', params=[('login', login) for login in logins])
+        r.raise_for_status()
+        return {user['login']: user['id'] for user in r.json().get('data') or []}
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+
+
+def get_client():
+    """
+    Returns the client of the current process. Worker processes forked from
+    the parent get their own client instead of sharing its sockets.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = TwitchClient()
+        _client_pid = os.getpid()
+    return _client
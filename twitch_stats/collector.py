@@ -0,0 +1,66 @@
+"""
+    Stats collector that polls every tracked channel from one process.
+
+    Requests run on an eventlet GreenPool through the process' keep-alive
+    client, so the process has to be monkey patched, as Celery's eventlet
+    pool and the collect_stats command do.
+"""
+import logging
+import time
+
+import requests
+from eventlet import GreenPool
+
+from .client import get_client
+from .models import TwitchTrackingProfile, TwitchStats
+from .settings import TWITCH_COLLECTOR_CONCURRENCY, TWITCH_STREAMS_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCollector(object):
+    """
+    Polls the streams endpoint for all due channels, or the ones of `shard`,
+    keeping at most `concurrency` requests in flight, and stores results
+    through TwitchStats.objects.save_streams.
+    """
+
+    def __init__(self, concurrency=TWITCH_COLLECTOR_CONCURRENCY, batch_size=TWITCH_STREAMS_BATCH_SIZE, shard=None):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.shard = shard
+
+    def run_cycle(self):
+        """
+        Runs a single collection cycle and returns its summary.
+        """
+        started = time.monotonic()
+        client = get_client()
+        twitch_ids = TwitchTrackingProfile.objects.due_ids(shard=self.shard)
+        chunks = [twitch_ids[i:i + self.batch_size] for i in range(0, len(twitch_ids), self.batch_size)]
+        live = failed = 0
+
+        def fetch(chunk):
+            try:
+                return chunk, client.get_streams(chunk), None
+            except (requests.RequestException, ValueError) as e:
+                return chunk, None, e
+
+        # imap hands the results back to this greenlet, so database writes stay on one connection.
+        for chunk, streams, error in GreenPool(self.concurrency).imap(fetch, chunks):
+            if error is not None:
+                failed += 1
+                logger.warning("Failed to fetch streams: %s", error)
+                continue
+            live += TwitchStats.objects.save_streams(streams, channel_ids=chunk)
+
+        result = {
+            'channels': len(twitch_ids),
+            'requests': len(chunks),
+            'failed': failed,
+            'live': live,
+            'duration': time.monotonic() - started,
+        }
+        logger.info("Collected stats for %(channels)d channels (%(live)d live) with %(requests)d requests, "
+                    "%(failed)d failed, in %(duration).2fs", result)
+        return result
@@ -0,0 +1,138 @@
+"""
+    Cache of Twitch user lookups (id -> name and name -> id).
+
+    Lookups are kept in an in-process LRU and, when TWITCH_DIRECTORY_CACHE is
+    set, in a shared Django cache, so a user is fetched from Twitch once per
+    TWITCH_DIRECTORY_TTL no matter how many requests or workers ask for it.
+    Users that do not exist are remembered for TWITCH_DIRECTORY_NEGATIVE_TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+from .client import get_client, TWITCH_USERS_BATCH_SIZE
+from .settings import TWITCH_DIRECTORY_CACHE, TWITCH_DIRECTORY_TTL, TWITCH_DIRECTORY_NEGATIVE_TTL, \
+    TWITCH_DIRECTORY_MAX_SIZE
+
+# Cached value of users that do not exist.
+MISSING = ''
+
+
+class UserDirectory(object):
+    prefix = 'twitch_stats:directory'
+
+    def __init__(self, ttl=TWITCH_DIRECTORY_TTL, negative_ttl=TWITCH_DIRECTORY_NEGATIVE_TTL,
+                 max_size=TWITCH_DIRECTORY_MAX_SIZE, alias=TWITCH_DIRECTORY_CACHE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def get_users(self, user_ids):
+        """
+        Returns {id: name} of the existing users among `user_ids`, fetching
+        uncached ones with one users request per 100 ids.
+        """
+        user_ids = [str(user_id) for user_id in user_ids]
+        found = self._lookup('id', user_ids)
+        missing = [user_id for user_id in OrderedDict.fromkeys(user_ids) if user_id not in found]
+        for i in range(0, len(missing), TWITCH_USERS_BATCH_SIZE):
+            chunk = missing[i:i + TWITCH_USERS_BATCH_SIZE]
+            users = get_client().get_users(chunk)
+            self._store('id', {user_id: users.get(user_id, MISSING) for user_id in chunk})
+            self._store('name', {name: user_id for user_id, name in users.items()})
+            found.update({user_id: users.get(user_id, MISSING) for user_id in chunk})
+        return {user_id: name for user_id, name in found.items() if name}
+
+    def get_name(self, user_id):
+        return self.get_users([user_id]).get(str(user_id))
+
+    def get_ids(self, names):
+        """
+        Returns {name: id} of the existing users among `names`, fetching
+        uncached ones with one users request per 100 names.
+        """
+        names = [name.lower() for name in names]
+        found = self._lookup('name', names)
+        missing = [name for name in OrderedDict.fromkeys(names) if name not in found]
+        for i in range(0, len(missing), TWITCH_USERS_BATCH_SIZE):
+            chunk = missing[i:i + TWITCH_USERS_BATCH_SIZE]
+            users = get_client().get_users_by_login(chunk)
+            self._store('name', {name: users.get(name, MISSING) for name in chunk})
+            self._store('id', {user_id: name for name, user_id in users.items()})
+            found.update({name: users.get(name, MISSING) for name in chunk})
+        return {name: user_id for name, user_id in found.items() if user_id}
+
+    def peek_id(self, name):
+        """
+        Returns the cached id of a name without asking Twitch, None when unknown.
+        """
+        return self._lookup('name', [name.lower()]).get(name.lower()) or None
+
+    def add(self, user_id, name):
+        """
+        Stores a user fetched by other means, e.g. from the authenticated user endpoint.
+        """
+        self._store('id', {str(user_id): name.lower()})
+        self._store('name', {name.lower(): str(user_id)})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _key(self, kind, value):
+        return '{}:{}:{}'.format(self.prefix, kind, value)
+
+    def _lookup(self, kind, values):
+        """
+        Returns {value: cached result} of the cached values, MISSING for users known not to exist.
+        """
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for value in values:
+                entry = self._entries.get((kind, value))
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._entries[(kind, value)]
+                    continue
+                self._entries.move_to_end((kind, value))
+                found[value] = entry[1]
+        missing = [value for value in values if value not in found]
+        if missing and self.shared is not None:
+            cached = self.shared.get_many([self._key(kind, value) for value in missing])
+            for value in missing:
+                result = cached.get(self._key(kind, value))
+                if result is not None:
+                    self._set_local(kind, value, result)
+                    found[value] = result
+        return found
+
+    def _store(self, kind, results):
+        for value, result in results.items():
+            self._set_local(kind, value, result)
+        if self.shared is not None:
+            for ttl, items in ((self.ttl, {k: v for k, v in results.items() if v != MISSING}),
+                               (self.negative_ttl, {k: v for k, v in results.items() if v == MISSING})):
+                if items:
+                    self.shared.set_many({self._key(kind, k): v for k, v in items.items()}, timeout=ttl)
+
+    def _set_local(self, kind, value, result):
+        ttl = self.negative_ttl if result == MISSING else self.ttl
+        with self._lock:
+            self._entries[(kind, value)] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end((kind, value))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+directory = UserDirectory()
@@ -0,0 +1,68 @@
+"""
+    Plain btree indexes built without blocking writes.
+
+    Django 1.10 has no Meta.indexes, and db_index on a TextField also adds a
+    text_pattern_ops index on Postgres that no query here uses. Indexes of the
+    large tables are added with AddIndexConcurrently instead, from migrations
+    that set `atomic = False` so Postgres can build them CONCURRENTLY.
+"""
+from django.db.migrations.operations.base import Operation
+
+
+class AddIndexConcurrently(Operation):
+    """
+    Creates an index of `table` on `columns`, concurrently on Postgres. The
+    model state is left alone, the index is not declared on the model.
+    """
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, table, name, columns, using=None):
+        self.table = table
+        self.name = name
+        self.columns = columns
+        self.using = using
+
+    def deconstruct(self):
+        kwargs = {'table': self.table, 'name': self.name, 'columns': self.columns}
+        if self.using:
+            kwargs['using'] = self.using
+        return self.__class__.__name__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not self.supported(schema_editor):
+            return
+        concurrently = self.concurrently(schema_editor)
+        if concurrently:
+            # A failed concurrent build leaves an invalid index behind, which IF NOT EXISTS would keep.
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute('SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+                               'WHERE pg_class.relname = %s AND NOT pg_index.indisvalid', [self.name])
+                if cursor.fetchone():
+                    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(self.name))
+        schema_editor.execute('CREATE INDEX{} IF NOT EXISTS {} ON {}{} ({})'.format(
+            concurrently, self.name, self.table, ' USING {}'.format(self.using) if self.using else '',
+            ', '.join(self.columns)))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not self.supported(schema_editor):
+            return
+        schema_editor.execute('DROP INDEX{} IF EXISTS {}'.format(self.concurrently(schema_editor), self.name))
+
+    def supported(self, schema_editor):
+        # Index methods such as brin only exist on Postgres.
+        return not self.using or schema_editor.connection.vendor == 'postgresql'
+
+    @staticmethod
+    def concurrently(schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        if schema_editor.connection.in_atomic_block:
+            raise ValueError('AddIndexConcurrently needs a migration with atomic = False.')
+        return ' CONCURRENTLY'
+
+    def describe(self):
+        return 'Create index {} on {} ({})'.format(self.name, self.table, ', '.join(self.columns))
@@ -0,0 +1,109 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from twitch_stats.models import TwitchStats
+
+CHANNEL_PREFIX = 'benchmark-'
+
+
+class Command(BaseCommand):
+    help = 'Fills TwitchStats with synthetic rows in steps and times the stats queries at every step.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100000,1000000,10000000',
+                            help='Comma separated table sizes to measure at.')
+        parser.add_argument('--channels', type=int, default=2000, help='Number of synthetic channels.')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query, the best one is reported.')
+        parser.add_argument('--explain', action='store_true', help='Print query plans (Postgres only).')
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic rows afterwards.')
+        parser.add_argument('--yes', action='store_true', help='Confirm writing to the configured database.')
+
+    def handle(self, *args, **options):
+        if not options['yes']:
+            raise CommandError('This writes millions of rows to the configured database, pass --yes to run it.')
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        self.channels = options['channels']
+        try:
+            for size in sizes:
+                self.fill(size)
+                self.stdout.write('{} rows'.format(TwitchStats.objects.count()))
+                for name, query in self.get_queries():
+                    best = min(self.run(query) for _ in range(options['repeat']))
+                    self.stdout.write('  {:<24} {:8.2f} ms'.format(name, best * 1000))
+                    if options['explain'] and connection.vendor == 'postgresql':
+                        self.stdout.write(query.explain_text())
+        finally:
+            if not options['keep']:
+                TwitchStats.objects.filter(channel_id__startswith=CHANNEL_PREFIX).delete()
+
+    def fill(self, size):
+        missing = size - TwitchStats.objects.filter(channel_id__startswith=CHANNEL_PREFIX).count()
+        if missing <= 0:
+            return
+        if connection.vendor == 'postgresql':
+            # Generating rows server side is orders of magnitude faster than bulk_create.
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO twitch_stats_twitchstats
+                        (stream_id, game, delay, average_fps, current_viewers, channel_id, channel_status,
+                         channel_mature, channel_language, went_live, is_playlist, is_partner, total_views,
+                         total_followers, created)
+                    SELECT 'benchmark-stream-' || (i / 300), 'Game', 0, 60, i %% 5000,
+                           %s || (i %% %s), 'Status', false, 'en', now(), false, false, i, i,
+                           now() - (%s - i) * interval '1 minute' / %s
+                    FROM generate_series(1, %s) AS i
+                """, [CHANNEL_PREFIX, self.channels, missing, self.channels, missing])
+            return
+        now = timezone.now()
+        batch = []
+        for i in range(missing):
+            batch.append(TwitchStats(stream_id='benchmark-stream-{}'.format(i // 300), game='Game', delay=0,
+                                     average_fps=60, current_viewers=i % 5000,
+                                     channel_id='{}{}'.format(CHANNEL_PREFIX, i % self.channels),
+                                     channel_status='Status', channel_language='en', went_live=now,
+                                     total_views=i, total_followers=i))
+            if len(batch) == 10000:
+                TwitchStats.objects.bulk_create(batch)
+                batch = []
+        TwitchStats.objects.bulk_create(batch)
+
+    def get_queries(self):
+        channel_id = '{}0'.format(CHANNEL_PREFIX)
+        week_ago = timezone.now() - timedelta(days=7)
+        return [
+            ('channel first page', BenchmarkQuery(
+                TwitchStats.objects.filter(channel_id=channel_id).order_by('created', 'id')[:100])),
+            ('channel last week', BenchmarkQuery(
+                TwitchStats.objects.filter(channel_id=channel_id, created__gte=week_ago)
+                .order_by('created', 'id')[:100])),
+            ('channel latest', BenchmarkQuery(
+                TwitchStats.objects.filter(channel_id=channel_id).order_by('-created')[:1])),
+            ('stream lookup', BenchmarkQuery(
+                TwitchStats.objects.filter(stream_id='benchmark-stream-0')[:100])),
+            ('all channels last hour', BenchmarkQuery(
+                TwitchStats.objects.filter(created__gte=timezone.now() - timedelta(hours=1)).values('id')[:1000])),
+        ]
+
+    @staticmethod
+    def run(query):
+        started = time.perf_counter()
+        query.evaluate()
+        return time.perf_counter() - started
+
+
+class BenchmarkQuery(object):
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def evaluate(self):
+        list(self.queryset._clone())
+
+    def explain_text(self):
+        sql, params = self.queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+            return '\n'.join('    ' + row[0] for row in cursor.fetchall())
@@ -0,0 +1,31 @@
+import time
+
+import eventlet
+from django.core.management.base import BaseCommand
+
+from twitch_stats.collector import StatsCollector
+from twitch_stats.settings import TWITCH_COLLECTOR_CONCURRENCY
+
+
+class Command(BaseCommand):
+    help = 'Collects stats for all tracked channels with the green pool collector.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=TWITCH_COLLECTOR_CONCURRENCY,
+                            help='Maximum number of requests in flight.')
+        parser.add_argument('--interval', type=int, default=60,
+                            help='Seconds between the start of two cycles.')
+        parser.add_argument('--shard', type=int, default=None, help='Only collect the channels of this shard.')
+        parser.add_argument('--once', action='store_true', help='Run a single cycle and exit.')
+
+    def handle(self, *args, **options):
+        # Requests only overlap once sockets cooperate with the green pool.
+        eventlet.monkey_patch(socket=True, select=True)
+        collector = StatsCollector(concurrency=options['concurrency'], shard=options['shard'])
+        while True:
+            result = collector.run_cycle()
+            self.stdout.write("Collected {channels} channels ({live} live) with {requests} requests, "
+                              "{failed} failed, in {duration:.2f}s".format(**result))
+            if options['once']:
+                break
+            time.sleep(max(options['interval'] - result['duration'], 0))
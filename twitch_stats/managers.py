@@ -1,55 +1,40 @@
 import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from uuid import UUID
 
-import django_celery_beat
-from django.db import models
-import requests
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
 import dateutil.parser
+from django.apps import apps
 from django_celery_beat.models import PeriodicTask, IntervalSchedule
 
-from .settings import TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, TWITCH_REDIRECT_URI, TWITCH_VERSION_HEADERS
+from . import partitions, shards
+from .cache import touch_channels
+from .client import get_client
+from .directory import directory
+from .settings import TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, TWITCH_REDIRECT_URI, TWITCH_STATS_STORAGE, \
+    TWITCH_ROLLUP_BATCH_SIZE, TWITCH_ROLLUP_INTERVAL, TWITCH_ROLLUP_LAG, TWITCH_STATS_RAW_RETENTION_DAYS, \
+    TWITCH_ROLLUP_RETENTION_DAYS, TWITCH_STATS_PARTITIONS_AHEAD, TWITCH_EXPORT_CHUNK_SIZE, TWITCH_POLL_INTERVAL, \
+    TWITCH_POLL_MAX_INTERVAL, TWITCH_COLLECTION_SHARDS, TWITCH_VERIFY_REQUEUE_INTERVAL
 
 
 class TwitchProfileManager(models.Manager):
     def get_from_id_or_username_or_uuid(self, identifier):
-        response = self.get_from_uuid(identifier)
-        if response:
-            return response
-
-        response = self.get_from_username(identifier)
-        if response:
-            return response
-
-        response = self.get_from_id(identifier)
-        if response:
-            return response
-        else:
-            return None
-
-    def get_from_uuid(self, identifier):
+        """
+        Resolves a profile from a user uuid, twitch name or twitch id with a single query.
+        """
         try:
-            from uuid import UUID
-            user_id = UUID(identifier, version=4)
-            try:
-                obj = self.model.objects.get(user=user_id)
-                return obj
-            except self.model.DoesNotExist:
-                return None
+            return self.filter(user=UUID(identifier, version=4)).first()
         except ValueError:
-            return None
-
-    def get_from_username(self, identifier):
-        try:
-            obj = self.model.objects.get(twitch_name=identifier.lower())
-            return obj
-        except self.model.DoesNotExist:
-            return None
-
-    def get_from_id(self, identifier):
-        try:
-            obj = self.model.objects.get(twitch_id=identifier)
-            return obj
-        except self.model.DoesNotExist:
-            return None
+            pass
+        if identifier.isdigit():
+            profiles = list(self.filter(Q(twitch_name=identifier) | Q(twitch_id=identifier))[:2])
+            # A name match wins over an id match, same as the lookup order before.
+            profiles.sort(key=lambda profile: profile.twitch_name != identifier)
+            return profiles[0] if profiles else None
+        return self.filter(twitch_name=identifier.lower()).first()
 
     def create_from_code(self, code=None, **kwargs):
         user = kwargs.pop('user')
@@ -60,6 +45,7 @@ class TwitchProfileManager(models.Manager):
             return "Unauthorized token.", False
         response = self._get_user_info(token=token)
         twitch_id = response['_id']
+        directory.add(twitch_id, response['name'])
         if self.filter(twitch_id=twitch_id).count() > 0:
             return "Twitch account already linked.", False
         twitch_email = response['email']
@@ -76,14 +62,10 @@ class TwitchProfileManager(models.Manager):
         return "Successfully linked profile.", True
 
     def _get_oauth(self, code=None):
-        state = uuid.uuid4()
-        url = "https://api.twitch.tv/kraken/oauth2/token?client_id={0}&client_secret={1}&" \
-              "grant_type=authorization_code&redirect_uri={2}&code={3}&state={4}".format(TWITCH_CLIENT_ID,
-                                                                                         TWITCH_CLIENT_SECRET,
-                                                                                         TWITCH_REDIRECT_URI,
-                                                                                         code,
-                                                                                         state)
-        r = requests.post(url=url)
+        params = {'client_id': TWITCH_CLIENT_ID, 'client_secret': TWITCH_CLIENT_SECRET,
+                  'grant_type': 'authorization_code', 'redirect_uri': TWITCH_REDIRECT_URI,
+                  'code': code, 'state': uuid.uuid4()}
+        r = get_client().post('oauth2/token', params=params)
         if 'error' in r.json():
             return None, None, None
         token = r.json()['access_token']
@@ -92,25 +74,121 @@ class TwitchProfileManager(models.Manager):
         return token, refresh_token, scopes
 
     def _get_user_info(self, token=None):
-        url = "https://api.twitch.tv/kraken/user"
-        headers = {'Accept': TWITCH_VERSION_HEADERS, 'Client-ID': TWITCH_CLIENT_ID,
-                   'Authorization': 'OAuth {}'.format(token)}
-        r = requests.get(url=url, headers=headers)
+        headers = {'Authorization': 'OAuth {}'.format(token)}
+        r = get_client().get('user', headers=headers)
         return r.json()
 
 
 class TwitchTrackingProfileManager(models.Manager):
     def get_or_create(self, t_id=None):
+        """
+        Returns the profile of a twitch id, new ones are created pending verification.
+        """
         if not t_id:
             return None
-        try:
-            profile = self.get(twitch_id=t_id)
-            return profile
-        except self.model.DoesNotExist:
-            is_true, t_name = self._verify_id(t_id=t_id)
-            if is_true:
-                return self.create(twitch_id=t_id, twitch_name=t_name)
-        return None
+        return self.get_or_create_many([t_id])[0]
+
+    def get_or_create_many(self, t_ids):
+        """
+        Returns the profiles of a list of twitch ids with one query. Unknown
+        ids are created in one insert, pending verification by a background task.
+        """
+        t_ids = list(OrderedDict.fromkeys(str(t_id) for t_id in t_ids if t_id))
+        profiles = {}
+        for profile in self.filter(twitch_id__in=t_ids):
+            profiles.setdefault(profile.twitch_id, profile)
+
+        missing = [t_id for t_id in t_ids if t_id not in profiles]
+        if missing:
+            self.bulk_create([self.model(twitch_id=t_id, twitch_name='', status=self.model.PENDING,
+                                         shard_bucket=shards.shard_bucket(t_id)) for t_id in missing])
+            # Primary keys are only set by bulk_create on Postgres.
+            for profile in self.filter(twitch_id__in=missing):
+                profiles.setdefault(profile.twitch_id, profile)
+        return [profiles[t_id] for t_id in t_ids]
+
+    def verify_pending(self, t_ids):
+        """
+        Verifies pending profiles of a list of twitch ids through the user
+        directory and stores the result with two updates. Returns the invalid ids.
+        """
+        t_ids = list(self.filter(twitch_id__in=t_ids, status=self.model.PENDING)
+                     .order_by('twitch_id').values_list('twitch_id', flat=True).distinct())
+        verified = directory.get_users(t_ids)
+        if verified:
+            self.filter(twitch_id__in=list(verified), status=self.model.PENDING).update(
+                status=self.model.VERIFIED,
+                twitch_name=Case(*[When(twitch_id=t_id, then=Value(name)) for t_id, name in verified.items()],
+                                 output_field=models.TextField()))
+        invalid = [t_id for t_id in t_ids if t_id not in verified]
+        if invalid:
+            self.filter(twitch_id__in=invalid, status=self.model.PENDING).update(status=self.model.INVALID)
+        return invalid
+
+    def pending_ids(self):
+        """
+        Distinct twitch ids of the profiles still waiting for verification.
+        """
+        return list(self.filter(status=self.model.PENDING).order_by('twitch_id')
+                    .values_list('twitch_id', flat=True).distinct())
+
+    def verified_ids(self):
+        """
+        Distinct twitch ids of the verified profiles, the ones stats are collected for.
+        """
+        return list(self.filter(status=self.model.VERIFIED).values_list('twitch_id', flat=True).distinct())
+
+    def due_ids(self, shard=None):
+        """
+        Distinct twitch ids of the verified profiles due for polling in the current
+        cycle, limited to the channels of `shard` when given.
+        """
+        # Half an interval of slack, so channels scheduled for the next cycle are not skipped by jitter.
+        due = timezone.now() + timedelta(seconds=TWITCH_POLL_INTERVAL / 2)
+        queryset = self.filter(Q(next_poll_at__isnull=True) | Q(next_poll_at__lte=due), status=self.model.VERIFIED)
+        if shard is not None and TWITCH_COLLECTION_SHARDS > 1:
+            queryset = queryset.filter(shard_bucket__in=shards.shard_buckets(shard, shards=TWITCH_COLLECTION_SHARDS))
+        return list(queryset.values_list('twitch_id', flat=True).distinct())
+
+    def schedule_polls(self, live, offline):
+        """
+        Schedules the next poll of polled channels. `live` maps live channel ids to
+        the hour (UTC) they went live, which is remembered in `live_hours`. Offline
+        channels back off exponentially up to TWITCH_POLL_MAX_INTERVAL, except in
+        and right before the hours they usually go live.
+        Channels sharing a schedule are updated together.
+        """
+        now = timezone.now()
+        by_hour = {}
+        for channel_id, hour in live.items():
+            by_hour.setdefault(hour, []).append(channel_id)
+        for hour, channel_ids in by_hour.items():
+            self.filter(twitch_id__in=channel_ids).update(
+                next_poll_at=now, offline_streak=0, live_hours=F('live_hours').bitor(1 << hour))
+
+        boost_hours = (1 << now.hour) | (1 << (now.hour + 1) % 24)
+        by_delay = {}
+        for channel_id, streak, live_hours in self.filter(twitch_id__in=list(offline)) \
+                .values_list('twitch_id', 'offline_streak', 'live_hours'):
+            if live_hours & boost_hours:
+                delay = TWITCH_POLL_INTERVAL
+            else:
+                delay = min(TWITCH_POLL_INTERVAL * 2 ** min(streak + 1, 16), TWITCH_POLL_MAX_INTERVAL)
+            by_delay.setdefault(delay, set()).add(channel_id)
+        for delay, channel_ids in by_delay.items():
+            self.filter(twitch_id__in=list(channel_ids)).update(
+                next_poll_at=now + timedelta(seconds=delay), offline_streak=F('offline_streak') + 1)
+
+    def remove_many(self, t_ids, user=None):
+        """
+        Removes twitch ids from the tracking list of `user` and deletes the
+        profiles nobody tracks anymore. Returns the removed ids.
+        """
+        profiles = list(self.filter(twitch_id__in=[str(t_id) for t_id in t_ids], tracking_profile=user))
+        if profiles:
+            user.tracking_users.remove(*profiles)
+            self.filter(pk__in=[profile.pk for profile in profiles], tracking_profile__isnull=True).delete()
+        return [profile.twitch_id for profile in profiles]
 
     def can_delete(self, obj=None):
         if obj.tracking_profile.count() > 0:
@@ -121,126 +199,397 @@ class TwitchTrackingProfileManager(models.Manager):
     @staticmethod
     def _verify_id(t_id=None):
         if t_id:
-            url = "https://api.twitch.tv/kraken/users/{}".format(t_id)
-            headers = {'Accept': TWITCH_VERSION_HEADERS, 'Client-ID': TWITCH_CLIENT_ID}
-            r = requests.get(url=url, headers=headers)
-            r_id = r.json().get('_id')
-            r_name = r.json().get('name')
-            if r_id and r_name and t_id == r_id:
-                return True, r_name
+            name = directory.get_name(t_id)
+            if name:
+                return True, name
             else:
                 return False, None
         else:
             return False, None
 
     def get_from_id_or_name_with_user(self, identifier=None, user=None):
-        response = self.get_from_username(identifier=identifier, user=user)
-        if response:
-            return response
-
-        response = self.get_from_id(identifier=identifier, user=user)
-        if response:
-            return response
-        else:
-            return None
-
-    def get_from_username(self, identifier=None, user=None):
-        try:
-            obj = self.model.objects.get(twitch_name=identifier.lower(), tracking_profile=user)
-            return obj
-        except self.model.DoesNotExist:
-            return None
-
-    def get_from_id(self, identifier, user=None):
-        try:
-            obj = self.model.objects.get(twitch_id=identifier, tracking_profile=user)
-            return obj
-        except self.model.DoesNotExist:
-            return None
+        """
+        Resolves a profile tracked by `user` from a twitch name or id with a single query.
+        A name already known to the user directory also matches the profile's id,
+        so channels are found by their current name after a rename.
+        """
+        name = identifier.lower()
+        query = Q(twitch_name=name) | Q(twitch_id=identifier)
+        cached_id = directory.peek_id(name)
+        if cached_id:
+            query |= Q(twitch_id=cached_id)
+        profiles = list(self.filter(query, tracking_profile=user)[:3])
+        profiles.sort(key=lambda profile: (profile.twitch_name != name, profile.twitch_id != identifier))
+        return profiles[0] if profiles else None
 
 
 class TwitchStatsManager(models.Manager):
     def get_stats(self, twitch_id=None):
         if not twitch_id:
             return
-        url = "https://api.twitch.tv/kraken/streams/{}".format(twitch_id)
-        headers = {'Accept': TWITCH_VERSION_HEADERS, 'Client-ID': TWITCH_CLIENT_ID}
-        r = requests.get(url=url, headers=headers)
-        stream = r.json()['stream']
-        if stream:
-            stats = self.create(
-                stream_id=stream['_id'],
-                game=stream['game'],
-                delay=stream['delay'],
-                went_live=stream['created_at'],
-                average_fps=stream['average_fps'],
-                current_viewers=stream['viewers'],
-                channel_id=stream['channel']['_id'],
-                channel_status=stream['channel']['status'],
-                channel_mature=stream['channel']['mature'],
-                channel_language=stream['channel']['broadcaster_language'],
-                is_playlist=stream['is_playlist'],
-                is_partner=stream['channel']['partner'],
-                total_views=stream['channel']['views'],
-                total_followers=stream['channel']['followers']
-            )
-            return True
-        return False
+        r = get_client().get('streams/{}'.format(twitch_id))
+        if not r.ok:
+            return False
+        stream = r.json().get('stream')
+        self.save_streams([stream] if stream else [], channel_ids=[twitch_id])
+        return bool(stream)
+
+    def get_stats_batch(self, twitch_ids=None):
+        """
+        Collects stats for up to TWITCH_STREAMS_BATCH_SIZE channels with a single
+        streams request and a single insert. Returns the number of live channels.
+        """
+        if not twitch_ids:
+            return 0
+        return self.save_streams(get_client().get_streams(twitch_ids), channel_ids=twitch_ids)
+
+    def save_streams(self, streams, channel_ids=None):
+        """
+        Persists a list of stream objects from the streams endpoint in one insert
+        and refreshes the latest stats of the channels. `channel_ids` are the
+        polled channels, the ones without a stream are marked offline.
+        """
+        if TWITCH_STATS_STORAGE == 'delta':
+            saved = apps.get_model('twitch_stats', 'TwitchStatsSample').objects.save_streams(streams)
+        else:
+            self.bulk_create([self.model(**self._stats_from_stream(stream)) for stream in streams])
+            saved = len(streams)
+        apps.get_model('twitch_stats', 'TwitchLatestStats').objects.update_latest(streams, channel_ids=channel_ids)
+        if channel_ids is not None:
+            live = {str(stream['channel']['_id']): dateutil.parser.parse(stream['created_at']).hour
+                    for stream in streams}
+            offline = set(str(channel_id) for channel_id in channel_ids) - set(live)
+            apps.get_model('twitch_stats', 'TwitchTrackingProfile').objects.schedule_polls(live=live, offline=offline)
+        touch_channels(str(stream['channel']['_id']) for stream in streams)
+        return saved
+
+    def iter_history(self, channel_id, fields, start=None, end=None, chunk_size=TWITCH_EXPORT_CHUNK_SIZE):
+        """
+        Yields value tuples of a channel's snapshots ordered by (created, id).
+        Rows are read in keyset chunks, so memory stays flat for any history length.
+        """
+        if TWITCH_STATS_STORAGE == 'delta':
+            sample_model = apps.get_model('twitch_stats', 'TwitchStatsSample')
+            queryset = sample_model.objects.filter(stream__channel_id=channel_id)
+            fields = [name if name in sample_model.SAMPLE_FIELDS + ('created',) else 'stream__' + name
+                      for name in fields]
+        else:
+            queryset = self.filter(channel_id=channel_id)
+        if start:
+            queryset = queryset.filter(created__gte=start)
+        if end:
+            queryset = queryset.filter(created__lt=end)
+        queryset = queryset.order_by('created', 'id').values_list('created', 'id', *fields)
+
+        position = None
+        while True:
+            chunk = queryset
+            if position:
+                chunk = chunk.filter(Q(created__gt=position[0]) | Q(created=position[0], id__gt=position[1]))
+            rows = list(chunk[:chunk_size].iterator())
+            for row in rows:
+                yield row[2:]
+            if len(rows) < chunk_size:
+                return
+            position = rows[-1][:2]
+
+    @staticmethod
+    def _stats_from_stream(stream):
+        return dict(
+            stream_id=stream['_id'],
+            game=stream['game'],
+            delay=stream['delay'],
+            went_live=stream['created_at'],
+            average_fps=stream['average_fps'],
+            current_viewers=stream['viewers'],
+            channel_id=stream['channel']['_id'],
+            channel_status=stream['channel']['status'],
+            channel_mature=stream['channel']['mature'],
+            channel_language=stream['channel']['broadcaster_language'],
+            is_playlist=stream['is_playlist'],
+            is_partner=stream['channel']['partner'],
+            total_views=stream['channel']['views'],
+            total_followers=stream['channel']['followers']
+        )
 
     def start_collecting(self, interval=1):
-        if PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').count() == 0:
+        """
+        Creates (or enables) one collection task per shard. Tasks of shards that
+        no longer exist are removed. Returns False when nothing changed.
+        """
+        changed = False
+        expected = self._collection_tasks()
+        for task in PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats'):
+            if task.name not in expected:
+                task.delete()
+                changed = True
+            elif not task.enabled:
+                task.enabled = True
+                task.save()
+                changed = True
+        existing = set(PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats')
+                       .values_list('name', flat=True))
+        if len(existing) < len(expected):
             schedule, created = IntervalSchedule.objects.get_or_create(
                 every=interval,
                 period=IntervalSchedule.MINUTES,
             )
+            for name, (args, queue) in expected.items():
+                if name not in existing:
+                    PeriodicTask.objects.create(interval=schedule, name=name, task='twitch_stats.tasks.get_all_stats',
+                                                args=args, queue=queue)
+            changed = True
+        self._start_maintenance()
+        return changed
 
-            task = PeriodicTask.objects.create(
-                interval=schedule,
-                name='Collecting statistics',
-                task='twitch_stats.tasks.get_all_stats',
-            )
-            return True
-        elif PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').count() > 0:
-            task = PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').first()
-            if not task.enabled:
-                task.enabled = True
-                task.save()
-                return True
-            else:
-                return False
+    @staticmethod
+    def _collection_tasks():
+        """
+        Returns {name: (args, queue)} of the collection task of every shard.
+        """
+        if TWITCH_COLLECTION_SHARDS == 1:
+            return {'Collecting statistics': ('[]', None)}
+        return {'Collecting statistics (shard {})'.format(shard): ('[{}]'.format(shard), shards.shard_queue(shard))
+                for shard in range(TWITCH_COLLECTION_SHARDS)}
 
-    def stop_collecting(self):
-        if PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').count() == 1:
-            task = PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').first()
-            if task.enabled:
-                task.enabled = False
-                task.save()
-                return True
-            else:
-                return False
-        elif PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').count() > 1:
-            PeriodicTask.objects.all().delete()
-            return True
+    def _start_maintenance(self):
+        tasks = (
+            ('Updating statistics rollups', 'twitch_stats.tasks.update_rollups',
+             TWITCH_ROLLUP_INTERVAL, IntervalSchedule.MINUTES),
+            ('Applying statistics retention', 'twitch_stats.tasks.apply_retention', 1, IntervalSchedule.DAYS),
+            ('Requeueing pending verifications', 'twitch_stats.tasks.requeue_pending_verifications',
+             TWITCH_VERIFY_REQUEUE_INTERVAL, IntervalSchedule.MINUTES),
+        )
+        for name, task, every, period in tasks:
+            if PeriodicTask.objects.filter(task=task).count() == 0:
+                schedule, created = IntervalSchedule.objects.get_or_create(every=every, period=period)
+                PeriodicTask.objects.create(interval=schedule, name=name, task=task)
+
+    def apply_retention(self):
+        """
+        Removes raw snapshots older than TWITCH_STATS_RAW_RETENTION_DAYS. Whole
+        partitions are dropped when the table is partitioned, otherwise rows
+        are deleted. Also makes sure upcoming partitions exist.
+        """
+        partitions.ensure_partitions(months_ahead=TWITCH_STATS_PARTITIONS_AHEAD)
+        if not TWITCH_STATS_RAW_RETENTION_DAYS:
+            return
+        cutoff = timezone.now() - timedelta(days=TWITCH_STATS_RAW_RETENTION_DAYS)
+        if partitions.is_partitioned():
+            partitions.drop_partitions_before(cutoff)
         else:
-            return False
+            self.filter(created__lt=cutoff).delete()
+
+        sample_model = apps.get_model('twitch_stats', 'TwitchStatsSample')
+        sample_model.objects.filter(created__lt=cutoff).delete()
+        sample_model._meta.get_field('stream').related_model.objects \
+            .filter(created__lt=cutoff, samples__isnull=True).delete()
+        apps.get_model('twitch_stats', 'TwitchLatestStats').objects.exclude(
+            channel_id__in=apps.get_model('twitch_stats', 'TwitchTrackingProfile').objects.values('twitch_id')
+        ).delete()
+
+    def stop_collecting(self):
+        tasks = list(PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats', enabled=True))
+        for task in tasks:
+            # Saved one by one, so the beat scheduler notices the change.
+            task.enabled = False
+            task.save()
+        return len(tasks) > 0
 
     def update_collecting(self, interval=5):
-        if PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').count() == 1:
+        tasks = PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats')
+        if tasks.exists():
             schedule, created = IntervalSchedule.objects.get_or_create(
                 every=interval,
                 period=IntervalSchedule.MINUTES,
             )
-            task = PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').first()
-            task.interval = schedule
-            task.save()
+            for task in tasks:
+                task.interval = schedule
+                task.save()
             return True
         else:
             return False
 
     def info_collecting(self):
-        print(django_celery_beat.__version__)
-        if PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').count() == 1:
-            task = PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').first()
-            return task
-        else:
-            return None
\ No newline at end of file
+        return list(PeriodicTask.objects.filter(task='twitch_stats.tasks.get_all_stats').order_by('name'))
+
+
+class TwitchLatestStatsManager(models.Manager):
+    def update_latest(self, streams, channel_ids=None):
+        """
+        Upserts the latest stats of every live channel in one statement and
+        marks the polled channels that are not live as offline.
+        """
+        rows = {}
+        for stream in streams:
+            stats = TwitchStatsManager._stats_from_stream(stream)
+            rows[str(stats['channel_id'])] = [stats[name] for name in self.model.LATEST_FIELDS]
+        offline = set(str(channel_id) for channel_id in channel_ids or []) - set(rows)
+
+        with transaction.atomic():
+            if rows:
+                if connection.vendor == 'postgresql':
+                    self._upsert(rows)
+                else:
+                    self.filter(channel_id__in=list(rows)).delete()
+                    self.bulk_create([self.model(channel_id=channel_id, is_live=True,
+                                                 **dict(zip(self.model.LATEST_FIELDS, values)))
+                                      for channel_id, values in rows.items()])
+            if offline:
+                self.filter(channel_id__in=list(offline), is_live=True).update(
+                    is_live=False, current_viewers=0, updated=timezone.now())
+
+    def _upsert(self, rows):
+        columns = ('channel_id', 'is_live', 'updated') + self.model.LATEST_FIELDS
+        now = timezone.now()
+        params = []
+        for channel_id, values in rows.items():
+            params.extend([channel_id, True, now] + values)
+        sql = 'INSERT INTO {table} ({columns}) VALUES {values} ' \
+              'ON CONFLICT (channel_id) DO UPDATE SET {updates}'.format(
+            table=self.model._meta.db_table,
+            columns=', '.join(columns),
+            values=', '.join(['({})'.format(', '.join(['%s'] * len(columns)))] * len(rows)),
+            updates=', '.join('{0} = EXCLUDED.{0}'.format(name) for name in columns[1:]),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def for_profile(self, profile):
+        """
+        Latest stats of every channel tracked by a profile.
+        """
+        return self.filter(channel_id__in=profile.tracking_users.values('twitch_id')) \
+            .order_by('-is_live', '-current_viewers')
+
+
+class TwitchStatsSampleManager(models.Manager):
+    def save_streams(self, streams):
+        """
+        Stores samples for a list of stream objects, adding a new stream
+        metadata version only for streams whose metadata changed.
+        """
+        if not streams:
+            return 0
+        stream_model = self.model._meta.get_field('stream').related_model
+        snapshots = [TwitchStatsManager._stats_from_stream(stream) for stream in streams]
+        stream_ids = [str(snapshot['stream_id']) for snapshot in snapshots]
+
+        latest = {}
+        for version in stream_model.objects.filter(stream_id__in=stream_ids).order_by('stream_id', '-id'):
+            latest.setdefault(version.stream_id, version)
+
+        samples = []
+        for snapshot in snapshots:
+            metadata = {name: snapshot[name] for name in stream_model.TRACKED_FIELDS}
+            metadata['stream_id'] = str(metadata['stream_id'])
+            metadata['channel_id'] = str(metadata['channel_id'])
+            metadata['went_live'] = dateutil.parser.parse(metadata['went_live'])
+            version = latest.get(metadata['stream_id'])
+            if version is None or any(getattr(version, name) != value for name, value in metadata.items()):
+                # Metadata changes are rare, so these single inserts stay off the hot path.
+                version = stream_model.objects.create(**metadata)
+                latest[version.stream_id] = version
+            samples.append(self.model(stream=version, **{name: snapshot[name] for name in self.model.SAMPLE_FIELDS}))
+        self.bulk_create(samples)
+        return len(samples)
+
+    def for_channel(self, channel_id):
+        return self.select_related('stream').filter(stream__channel_id=channel_id)
+
+
+class TwitchStatsRollupManager(models.Manager):
+    BUCKETS = {
+        '5m': lambda dt: dt.replace(minute=dt.minute - dt.minute % 5, second=0, microsecond=0),
+        '1h': lambda dt: dt.replace(minute=0, second=0, microsecond=0),
+        '1d': lambda dt: dt.replace(hour=0, minute=0, second=0, microsecond=0),
+    }
+
+    def update_rollups(self, batch_size=TWITCH_ROLLUP_BATCH_SIZE):
+        """
+        Aggregates snapshots newer than the watermark into all resolutions,
+        one batch at a time. Returns the number of snapshots processed.
+        """
+        processed = 0
+        while True:
+            count = self._update_batch(batch_size=batch_size)
+            processed += count
+            if count < batch_size:
+                return processed
+
+    def get_source_rows(self):
+        """
+        Returns (id, channel_id, created, viewers, followers) rows of the current storage mode.
+        """
+        if TWITCH_STATS_STORAGE == 'delta':
+            return apps.get_model('twitch_stats', 'TwitchStatsSample').objects.values_list(
+                'id', 'stream__channel_id', 'created', 'current_viewers', 'total_followers')
+        return apps.get_model('twitch_stats', 'TwitchStats').objects.values_list(
+            'id', 'channel_id', 'created', 'current_viewers', 'total_followers')
+
+    @transaction.atomic
+    def _update_batch(self, batch_size):
+        watermark_model = apps.get_model('twitch_stats', 'TwitchStatsRollupWatermark')
+        watermark_model.objects.get_or_create(name=TWITCH_STATS_STORAGE)
+        watermark = watermark_model.objects.select_for_update().get(name=TWITCH_STATS_STORAGE)
+
+        # Rows younger than the lag may still have uncommitted neighbours with lower ids.
+        cutoff = timezone.now() - timedelta(seconds=TWITCH_ROLLUP_LAG)
+        rows = list(self.get_source_rows().filter(id__gt=watermark.last_id, created__lte=cutoff)
+                    .order_by('id')[:batch_size])
+        if not rows:
+            return 0
+
+        buckets = {}
+        for row_id, channel_id, created, viewers, followers in rows:
+            for resolution, truncate in self.BUCKETS.items():
+                key = (str(channel_id), resolution, truncate(created))
+                rollup = buckets.get(key)
+                if rollup is None:
+                    buckets[key] = self.model(channel_id=key[0], resolution=resolution, bucket=key[2],
+                                              min_viewers=viewers, max_viewers=viewers, viewers_sum=viewers,
+                                              samples=1, followers_start=followers, followers_end=followers)
+                else:
+                    self._add_sample(rollup, viewers, followers)
+
+        existing = {}
+        for resolution in self.BUCKETS:
+            keys = [key for key in buckets if key[1] == resolution]
+            rollups = self.filter(resolution=resolution, channel_id__in={key[0] for key in keys},
+                                  bucket__gte=min(key[2] for key in keys))
+            existing.update(((r.channel_id, r.resolution, r.bucket), r) for r in rollups)
+
+        new = []
+        for key, rollup in buckets.items():
+            current = existing.get(key)
+            if current is None:
+                new.append(rollup)
+                continue
+            current.min_viewers = min(current.min_viewers, rollup.min_viewers)
+            current.max_viewers = max(current.max_viewers, rollup.max_viewers)
+            current.viewers_sum += rollup.viewers_sum
+            current.samples += rollup.samples
+            current.followers_end = rollup.followers_end
+            current.save(update_fields=['min_viewers', 'max_viewers', 'viewers_sum', 'samples', 'followers_end'])
+        self.bulk_create(new)
+        touch_channels(key[0] for key in buckets)
+
+        watermark.last_id = rows[-1][0]
+        watermark.save()
+        return len(rows)
+
+    @staticmethod
+    def _add_sample(rollup, viewers, followers):
+        rollup.min_viewers = min(rollup.min_viewers, viewers)
+        rollup.max_viewers = max(rollup.max_viewers, viewers)
+        rollup.viewers_sum += viewers
+        rollup.samples += 1
+        rollup.followers_end = followers
+
+    def apply_retention(self):
+        """
+        Removes rollups older than the retention of their resolution.
+        """
+        for resolution, days in TWITCH_ROLLUP_RETENTION_DAYS.items():
+            if days:
+                self.filter(resolution=resolution, bucket__lt=timezone.now() - timedelta(days=days)).delete()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 10:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitch_stats', '0004_twitchstats_created'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwitchStream',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream_id', models.TextField()),
+                ('channel_id', models.TextField()),
+                ('game', models.TextField()),
+                ('delay', models.FloatField()),
+                ('channel_status', models.TextField()),
+                ('channel_mature', models.BooleanField(default=False)),
+                ('channel_language', models.TextField()),
+                ('went_live', models.DateTimeField()),
+                ('is_playlist', models.BooleanField(default=False)),
+                ('is_partner', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TwitchStatsSample',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_viewers', models.IntegerField()),
+                ('total_views', models.BigIntegerField()),
+                ('total_followers', models.BigIntegerField()),
+                ('average_fps', models.FloatField()),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('stream', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='samples', to='twitch_stats.TwitchStream')),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 11:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitch_stats', '0005_twitchstream_twitchstatssample'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwitchStatsRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel_id', models.TextField()),
+                ('resolution', models.CharField(choices=[('5m', '5 minutes'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket', models.DateTimeField()),
+                ('min_viewers', models.IntegerField()),
+                ('max_viewers', models.IntegerField()),
+                ('viewers_sum', models.BigIntegerField()),
+                ('samples', models.IntegerField()),
+                ('followers_start', models.BigIntegerField()),
+                ('followers_end', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TwitchStatsRollupWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Updated')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='twitchstatsrollup',
+            unique_together=set([('channel_id', 'resolution', 'bucket')]),
+        ),
+    ]
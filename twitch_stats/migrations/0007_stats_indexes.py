@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 11:48
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from twitch_stats.indexes import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # The stats table is large and written constantly, its indexes are built concurrently.
+    atomic = False
+
+    dependencies = [
+        ('twitch_stats', '0006_twitchstatsrollup_twitchstatsrollupwatermark'),
+    ]
+
+    operations = [
+        AddIndexConcurrently('twitch_stats_twitchstats', 'twitch_stats_twitchstats_stream_id', ['stream_id']),
+        AddIndexConcurrently('twitch_stats_twitchstats', 'twitch_stats_twitchstats_channel_created',
+                             ['channel_id', 'created']),
+        # Rows are appended in `created` order, so a BRIN index covers the column
+        # at a fraction of the size of a btree.
+        AddIndexConcurrently('twitch_stats_twitchstats', 'twitch_stats_twitchstats_created_brin', ['created'],
+                             using='brin'),
+        AddIndexConcurrently('twitch_stats_twitchstream', 'twitch_stats_twitchstream_stream_id', ['stream_id']),
+        AddIndexConcurrently('twitch_stats_twitchstream', 'twitch_stats_twitchstream_channel_id', ['channel_id']),
+        migrations.AlterIndexTogether(
+            name='twitchstatssample',
+            index_together=set([('stream', 'created')]),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 12:30
+from __future__ import unicode_literals
+
+from django.db import migrations, transaction
+from django.db.migrations.exceptions import IrreversibleError
+from django.utils import timezone
+
+from twitch_stats.partitions import STATS_TABLE, bound_literals, month_start, supports_partitioning
+
+
+def partition_stats_table(apps, schema_editor):
+    """
+    Replaces the stats table with one partitioned by month on `created`.
+    Existing rows become a single legacy partition ending with the current
+    month, so no data is copied. Needs Postgres 11 or newer.
+    """
+    connection = schema_editor.connection
+    if not supports_partitioning(connection):
+        return
+    legacy_until = month_start(timezone.now(), 1)
+    # Proving the legacy bound with a validated constraint lets ATTACH PARTITION
+    # skip its scan. VALIDATE runs in its own transaction and does not block writes.
+    schema_editor.execute('ALTER TABLE {0} DROP CONSTRAINT IF EXISTS {0}_legacy_bound'.format(STATS_TABLE))
+    schema_editor.execute('ALTER TABLE {0} ADD CONSTRAINT {0}_legacy_bound CHECK (created < %s) NOT VALID'
+                          .format(STATS_TABLE), [legacy_until])
+    schema_editor.execute('ALTER TABLE {0} VALIDATE CONSTRAINT {0}_legacy_bound'.format(STATS_TABLE))
+
+    with transaction.atomic(using=connection.alias):
+        schema_editor.execute('ALTER TABLE {0} RENAME TO {0}_legacy'.format(STATS_TABLE))
+        schema_editor.execute('CREATE TABLE {0} (LIKE {0}_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created)'
+                              .format(STATS_TABLE))
+        # The id sequence must outlive the legacy partition once retention drops it.
+        schema_editor.execute('ALTER SEQUENCE {0}_id_seq OWNED BY {0}.id'.format(STATS_TABLE))
+        schema_editor.execute('ALTER TABLE {0} ATTACH PARTITION {0}_legacy FOR VALUES FROM (MINVALUE) TO (%s)'
+                              .format(STATS_TABLE), bound_literals(legacy_until))
+        schema_editor.execute('ALTER TABLE {0}_legacy DROP CONSTRAINT {0}_legacy_bound'.format(STATS_TABLE))
+        schema_editor.execute('CREATE TABLE {0}_default PARTITION OF {0} DEFAULT'.format(STATS_TABLE))
+        # The legacy table already has equivalent indexes, which are attached instead of rebuilt.
+        schema_editor.execute('CREATE INDEX {0}_part_channel_created ON {0} (channel_id, created)'
+                              .format(STATS_TABLE))
+        schema_editor.execute('CREATE INDEX {0}_part_stream_id ON {0} (stream_id)'.format(STATS_TABLE))
+        schema_editor.execute('CREATE INDEX {0}_part_created_brin ON {0} USING brin (created)'.format(STATS_TABLE))
+
+
+def unpartition_stats_table(apps, schema_editor):
+    if supports_partitioning(schema_editor.connection):
+        raise IrreversibleError('The partitioned stats table cannot be turned back into a plain table.')
+
+
+class Migration(migrations.Migration):
+    # Runs in several transactions, see partition_stats_table.
+    atomic = False
+
+    dependencies = [
+        ('twitch_stats', '0007_stats_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_stats_table, unpartition_stats_table),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 13:21
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from twitch_stats.indexes import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('twitch_stats', '0008_partition_twitchstats'),
+    ]
+
+    operations = [
+        AddIndexConcurrently('twitch_stats_twitchprofile', 'twitch_stats_twitchprofile_twitch_id', ['twitch_id']),
+        AddIndexConcurrently('twitch_stats_twitchprofile', 'twitch_stats_twitchprofile_twitch_name', ['twitch_name']),
+        AddIndexConcurrently('twitch_stats_twitchtrackingprofile', 'twitch_stats_twitchtrackingprofile_twitch_id',
+                             ['twitch_id']),
+        AddIndexConcurrently('twitch_stats_twitchtrackingprofile', 'twitch_stats_twitchtrackingprofile_twitch_name',
+                             ['twitch_name']),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitch_stats', '0009_profile_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwitchLatestStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel_id', models.TextField(unique=True)),
+                ('is_live', models.BooleanField(default=False)),
+                ('stream_id', models.TextField()),
+                ('game', models.TextField()),
+                ('channel_status', models.TextField()),
+                ('current_viewers', models.IntegerField()),
+                ('total_views', models.BigIntegerField()),
+                ('total_followers', models.BigIntegerField()),
+                ('went_live', models.DateTimeField()),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Updated')),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitch_stats', '0010_twitchlateststats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='twitchtrackingprofile',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('verified', 'Verified'), ('invalid', 'Invalid')], default='verified', max_length=8),
+        ),
+    ]
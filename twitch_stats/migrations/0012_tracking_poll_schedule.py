@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 15:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitch_stats', '0011_twitchtrackingprofile_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='twitchtrackingprofile',
+            name='live_hours',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='twitchtrackingprofile',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='twitchtrackingprofile',
+            name='offline_streak',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 15:48
+from __future__ import unicode_literals
+
+import zlib
+
+from django.db import migrations, models
+
+SHARD_BUCKETS = 1024
+
+
+def set_shard_buckets(apps, schema_editor):
+    TwitchTrackingProfile = apps.get_model('twitch_stats', 'TwitchTrackingProfile')
+    buckets = {}
+    for pk, twitch_id in TwitchTrackingProfile.objects.values_list('pk', 'twitch_id'):
+        buckets.setdefault(zlib.crc32(twitch_id.encode('utf-8')) % SHARD_BUCKETS, []).append(pk)
+    for bucket, pks in buckets.items():
+        TwitchTrackingProfile.objects.filter(pk__in=pks).update(shard_bucket=bucket)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitch_stats', '0012_tracking_poll_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='twitchtrackingprofile',
+            name='shard_bucket',
+            field=models.SmallIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(set_shard_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 16:20
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from twitch_stats.settings import TWITCH_ROLLUP_INTERVAL
+
+MAINTENANCE_TASKS = (
+    ('Updating statistics rollups', 'twitch_stats.tasks.update_rollups', TWITCH_ROLLUP_INTERVAL, 'minutes'),
+    ('Applying statistics retention', 'twitch_stats.tasks.apply_retention', 1, 'days'),
+)
+
+
+def create_maintenance_tasks(apps, schema_editor):
+    """
+    Schedules rollups and retention on deploy, they used to be created only by start_collecting.
+    """
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    for name, task, every, period in MAINTENANCE_TASKS:
+        if not PeriodicTask.objects.filter(task=task).exists():
+            schedule, created = IntervalSchedule.objects.get_or_create(every=every, period=period)
+            PeriodicTask.objects.create(interval=schedule, name=name, task=task)
+
+
+def delete_maintenance_tasks(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(task__in=[task for name, task, every, period in MAINTENANCE_TASKS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '__first__'),
+        ('twitch_stats', '0013_twitchtrackingprofile_shard_bucket'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_maintenance_tasks, delete_maintenance_tasks),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 16:45
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from twitch_stats.settings import TWITCH_VERIFY_REQUEUE_INTERVAL
+
+TASK = 'twitch_stats.tasks.requeue_pending_verifications'
+
+
+def create_requeue_task(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    IntervalSchedule = apps.get_model('django_celery_beat', 'IntervalSchedule')
+    if not PeriodicTask.objects.filter(task=TASK).exists():
+        schedule, created = IntervalSchedule.objects.get_or_create(every=TWITCH_VERIFY_REQUEUE_INTERVAL,
+                                                                   period='minutes')
+        PeriodicTask.objects.create(interval=schedule, name='Requeueing pending verifications', task=TASK)
+
+
+def delete_requeue_task(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(task=TASK).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitch_stats', '0014_maintenance_tasks'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_requeue_task, delete_requeue_task),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 18:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitch_stats', '0015_requeue_pending_verifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwitchRateLimitBucket',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated', models.FloatField()),
+                ('blocked_until', models.FloatField(default=0)),
+            ],
+        ),
+    ]
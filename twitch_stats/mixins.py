@@ -0,0 +1,45 @@
+from django.http import Http404
+
+
+class RequestCacheMixin(object):
+    """
+    Caches objects resolved while handling a request, so repeated lookups
+    within the same request hit the database only once.
+    """
+
+    def get_request_cached(self, key, resolve):
+        cache = getattr(self.request, '_object_cache', None)
+        if cache is None:
+            cache = self.request._object_cache = {}
+        if key not in cache:
+            cache[key] = resolve()
+        return cache[key]
+
+
+class NestedParentMixin(RequestCacheMixin):
+    """
+    Resolves the parent object of a nested route once per request. The
+    identifier is read from the `parent_lookup_kwarg` URL kwarg and passed to
+    the `parent_lookup` method of `parent_model`'s manager, views with other
+    lookups override resolve_parent().
+    """
+    parent_lookup_kwarg = None
+    parent_model = None
+    parent_lookup = None
+
+    def resolve_parent(self, identifier):
+        """
+        Returns the parent for an identifier or None.
+        """
+        return getattr(self.parent_model.objects, self.parent_lookup)(identifier=identifier)
+
+    def get_parent(self):
+        try:
+            identifier = self.kwargs[self.parent_lookup_kwarg]
+        except KeyError:
+            raise Http404
+        obj = self.get_request_cached(('parent', identifier), lambda: self.resolve_parent(identifier))
+        if obj:
+            return obj
+        else:
+            raise Http404
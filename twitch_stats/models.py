@@ -2,10 +2,13 @@ from django.utils.translation import ugettext_lazy as _
 from django.db import models
 
 from hoffpw import settings
-from twitch_stats.managers import TwitchProfileManager, TwitchTrackingProfileManager, TwitchStatsManager
+from twitch_stats.shards import shard_bucket
+from twitch_stats.managers import TwitchProfileManager, TwitchTrackingProfileManager, TwitchStatsManager, \
+    TwitchStatsSampleManager, TwitchStatsRollupManager, TwitchLatestStatsManager
 
 
 class TwitchProfile(models.Model):
+    # twitch_id and twitch_name are indexed by migration 0009, see twitch_stats.indexes.
     twitch_id = models.TextField()
     twitch_name = models.TextField()
     twitch_display = models.TextField()
@@ -37,13 +40,37 @@ class TwitchProfile(models.Model):
 
 
 class TwitchTrackingProfile(models.Model):
+    PENDING = 'pending'
+    VERIFIED = 'verified'
+    INVALID = 'invalid'
+    STATUSES = (
+        (PENDING, _("Pending")),
+        (VERIFIED, _("Verified")),
+        (INVALID, _("Invalid")),
+    )
+
+    # twitch_id and twitch_name are indexed by migration 0009, see twitch_stats.indexes.
     twitch_id = models.TextField(max_length=254)
     twitch_name = models.TextField(max_length=254)
+    status = models.CharField(max_length=8, choices=STATUSES, default=VERIFIED)
+    # Polling schedule: when the channel is polled next, consecutive polls it was
+    # offline and a bitmask of the hours (UTC) it went live in.
+    next_poll_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    offline_streak = models.IntegerField(default=0)
+    live_hours = models.IntegerField(default=0)
+    # Hash bucket of the twitch id, mapped to a collection shard.
+    shard_bucket = models.SmallIntegerField(default=0, db_index=True)
 
     objects = TwitchTrackingProfileManager()
 
+    def save(self, *args, **kwargs):
+        self.shard_bucket = shard_bucket(self.twitch_id)
+        super(TwitchTrackingProfile, self).save(*args, **kwargs)
+
 
 class TwitchStats(models.Model):
+    # stream_id, (channel_id, created) and a BRIN index on created are added by
+    # migration 0007 without blocking writes, see twitch_stats.indexes.
     stream_id = models.TextField()
     game = models.TextField()
     delay = models.FloatField()
@@ -60,4 +87,129 @@ class TwitchStats(models.Model):
     total_followers = models.BigIntegerField()
     created = models.DateTimeField(_("Created"), auto_now_add=True)
 
-    objects = TwitchStatsManager()
\ No newline at end of file
+    objects = TwitchStatsManager()
+
+
+class TwitchLatestStats(models.Model):
+    """
+    Most recent snapshot of a channel, replaced by the collector on every poll.
+    Keeps the last known stream when the channel goes offline.
+    """
+    channel_id = models.TextField(unique=True)
+    is_live = models.BooleanField(default=False)
+    stream_id = models.TextField()
+    game = models.TextField()
+    channel_status = models.TextField()
+    current_viewers = models.IntegerField()
+    total_views = models.BigIntegerField()
+    total_followers = models.BigIntegerField()
+    went_live = models.DateTimeField()
+    updated = models.DateTimeField(_("Updated"), auto_now=True)
+
+    LATEST_FIELDS = ('stream_id', 'game', 'channel_status', 'current_viewers', 'total_views', 'total_followers',
+                     'went_live')
+
+    objects = TwitchLatestStatsManager()
+
+
+class TwitchStream(models.Model):
+    """
+    Slowly changing stream and channel metadata used by the delta storage mode.
+    A new version is stored only when one of the fields changes.
+    """
+    # stream_id and channel_id are indexed by migration 0007.
+    stream_id = models.TextField()
+    channel_id = models.TextField()
+    game = models.TextField()
+    delay = models.FloatField()
+    channel_status = models.TextField()
+    channel_mature = models.BooleanField(default=False)
+    channel_language = models.TextField()
+    went_live = models.DateTimeField()
+    is_playlist = models.BooleanField(default=False)
+    is_partner = models.BooleanField(default=False)
+    created = models.DateTimeField(_("Created"), auto_now_add=True)
+
+    TRACKED_FIELDS = ('stream_id', 'channel_id', 'game', 'delay', 'channel_status', 'channel_mature',
+                      'channel_language', 'went_live', 'is_playlist', 'is_partner')
+
+
+class TwitchStatsSample(models.Model):
+    """
+    High frequency part of a stats snapshot in the delta storage mode.
+    """
+    stream = models.ForeignKey(TwitchStream, related_name='samples', on_delete=models.CASCADE)
+    current_viewers = models.IntegerField()
+    total_views = models.BigIntegerField()
+    total_followers = models.BigIntegerField()
+    average_fps = models.FloatField()
+    created = models.DateTimeField(_("Created"), auto_now_add=True)
+
+    SAMPLE_FIELDS = ('current_viewers', 'total_views', 'total_followers', 'average_fps')
+
+    objects = TwitchStatsSampleManager()
+
+    class Meta:
+        index_together = [('stream', 'created')]
+
+    def to_stats(self):
+        """
+        Rebuilds the full (unsaved) TwitchStats row this sample represents.
+        """
+        fields = {name: getattr(self.stream, name) for name in TwitchStream.TRACKED_FIELDS}
+        fields.update({name: getattr(self, name) for name in self.SAMPLE_FIELDS})
+        return TwitchStats(created=self.created, **fields)
+
+
+class TwitchStatsRollup(models.Model):
+    """
+    Per channel aggregate of stats snapshots over a time bucket.
+    """
+    RESOLUTIONS = (
+        ('5m', _("5 minutes")),
+        ('1h', _("1 hour")),
+        ('1d', _("1 day")),
+    )
+
+    channel_id = models.TextField()
+    resolution = models.CharField(max_length=2, choices=RESOLUTIONS)
+    bucket = models.DateTimeField()
+    min_viewers = models.IntegerField()
+    max_viewers = models.IntegerField()
+    viewers_sum = models.BigIntegerField()
+    samples = models.IntegerField()
+    followers_start = models.BigIntegerField()
+    followers_end = models.BigIntegerField()
+
+    objects = TwitchStatsRollupManager()
+
+    class Meta:
+        unique_together = ('channel_id', 'resolution', 'bucket')
+
+    @property
+    def avg_viewers(self):
+        return self.viewers_sum / self.samples if self.samples else 0
+
+    @property
+    def followers_delta(self):
+        return self.followers_end - self.followers_start
+
+
+class TwitchStatsRollupWatermark(models.Model):
+    """
+    Last snapshot id aggregated into rollups for a storage mode.
+    """
+    name = models.CharField(max_length=32, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(_("Updated"), auto_now=True)
+
+
+class TwitchRateLimitBucket(models.Model):
+    """
+    Token bucket of a rate limit shared by every worker, see twitch_stats.ratelimit.
+    Times are unix timestamps so refills are plain arithmetic on every database.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    tokens = models.FloatField()
+    updated = models.FloatField()
+    blocked_until = models.FloatField(default=0)
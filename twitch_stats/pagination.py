@@ -0,0 +1,107 @@
+import base64
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_text
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on a (timestamp, id) pair, so every page costs
+    a range scan instead of an OFFSET. The pair is read from the view's
+    `cursor_fields` attribute. Responses keep the count/next/previous/results
+    shape of the page number pagination used before, the count is only
+    computed for the first page and is null on the pages behind a cursor.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fields = getattr(view, 'cursor_fields', ('created', 'id'))
+        self.page_size = self.get_page_size(request)
+        time_field, id_field = self.fields
+
+        cursor = self.decode_cursor(request)
+        self.count = queryset.count() if cursor is None else None
+        reverse = cursor is not None and cursor[0] == 'previous'
+        if reverse:
+            queryset = queryset.order_by('-' + time_field, '-' + id_field)
+        else:
+            queryset = queryset.order_by(*self.fields)
+        if cursor:
+            direction, value, pk = cursor
+            lookup = '__lt' if reverse else '__gt'
+            queryset = queryset.filter(Q(**{time_field + lookup: value}) |
+                                       Q(**{time_field: value, id_field + lookup: pk}))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.positions = [(getattr(obj, time_field), getattr(obj, id_field)) for obj in (results[:1] + results[-1:])]
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next or not self.positions:
+            return None
+        return self.get_link('next', self.positions[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.positions:
+            return None
+        return self.get_link('previous', self.positions[0])
+
+    def get_link(self, direction, position):
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   self.encode_cursor(direction, position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            direction, value, pk = force_text(base64.urlsafe_b64decode(encoded.encode('ascii'))).split('|')
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None or direction not in ('next', 'previous'):
+            raise NotFound(self.invalid_cursor_message)
+        return direction, value, pk
+
+    @staticmethod
+    def encode_cursor(direction, position):
+        value, pk = position
+        cursor = '{}|{}|{}'.format(direction, value.isoformat(), pk)
+        return force_text(base64.urlsafe_b64encode(cursor.encode('utf-8')))
@@ -0,0 +1,118 @@
+"""
+    Monthly range partitioning of the TwitchStats table on Postgres.
+
+    Migration 0008 turns twitch_stats_twitchstats into a table partitioned by
+    `created` (Postgres 11+). Existing rows stay in one legacy partition.
+    Other databases keep a plain table and fall back to row deletes.
+"""
+import re
+from datetime import datetime
+
+import dateutil.parser
+from django.db import connection, transaction
+from django.utils import timezone
+
+STATS_TABLE = 'twitch_stats_twitchstats'
+UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(dt, offset=0):
+    month = dt.month - 1 + offset
+    return datetime(dt.year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def supports_partitioning(connection=connection):
+    """
+    Declarative partitioning with default partitions needs Postgres 11.
+    """
+    return connection.vendor == 'postgresql' and connection.pg_version >= 110000
+
+
+def bound_literals(*bounds):
+    """
+    Partition bounds as strings: Postgres 11 only takes plain literals in
+    FOR VALUES, while datetimes are sent as `'...'::timestamptz` casts.
+    """
+    return [bound.isoformat() for bound in bounds]
+
+
+def is_partitioned():
+    if not supports_partitioning():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [STATS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def ensure_partitions(months_ahead=2):
+    """
+    Creates the partitions for the current month and the next `months_ahead`
+    months, and for every month that has rows in the default partition.
+    """
+    if not is_partitioned():
+        return []
+    now = timezone.now()
+    partitions = get_partitions()
+    names = set(name for name, bound in partitions)
+    covered = [bound for name, bound in partitions if bound is not None]
+    default = next((name for name, bound in partitions if bound is None), None)
+
+    months = set(month_start(now, offset) for offset in range(months_ahead + 1))
+    if default:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT date_trunc('month', created AT TIME ZONE 'UTC') FROM {}".format(default))
+            months.update(month.replace(tzinfo=timezone.utc) for month, in cursor.fetchall())
+
+    created = []
+    for start in sorted(months):
+        end = month_start(start, 1)
+        name = '{}_y{}m{:02d}'.format(STATS_TABLE, start.year, start.month)
+        if name in names or any(bound >= end for bound in covered):
+            # Exists, or covered by the legacy partition.
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            if default:
+                # Attaching a range fails while the default partition holds rows in it,
+                # so rows written while maintenance fell behind move to the new partition.
+                cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)'.format(name, STATS_TABLE))
+                cursor.execute('WITH moved AS (DELETE FROM {} WHERE created >= %s AND created < %s RETURNING *) '
+                               'INSERT INTO {} SELECT * FROM moved'.format(default, name), [start, end])
+                cursor.execute('ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)'
+                               .format(STATS_TABLE, name), bound_literals(start, end))
+            else:
+                cursor.execute('CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)'
+                               .format(name, STATS_TABLE), bound_literals(start, end))
+        created.append(name)
+    return created
+
+
+def get_partitions():
+    """
+    Returns (name, upper bound) of every partition, the bound is None for the default partition.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+        """, [STATS_TABLE])
+        partitions = []
+        for name, bound in cursor.fetchall():
+            match = UPPER_BOUND.search(bound)
+            partitions.append((name, dateutil.parser.parse(match.group(1)) if match else None))
+        return partitions
+
+
+def drop_partitions_before(cutoff):
+    """
+    Drops every partition whose rows are all older than `cutoff`.
+    """
+    dropped = []
+    with connection.cursor() as cursor:
+        for name, bound in get_partitions():
+            if bound is not None and bound <= cutoff:
+                cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(STATS_TABLE, name))
+                cursor.execute('DROP TABLE {}'.format(name))
+                dropped.append(name)
+    return dropped
@@ -0,0 +1,112 @@
+"""
+    Rate limiter shared by every worker through a database row.
+"""
+import time
+
+from django.apps import apps
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Greatest, Least
+
+from .settings import TWITCH_RATE_LIMIT, TWITCH_RATE_LIMIT_PERIOD
+
+
+class RateLimiter(object):
+    """
+    Token bucket holding up to `rate` requests, refilled with `rate` tokens
+    every `period` seconds. Taking a token is a single conditional UPDATE of
+    the bucket's row, which the database applies atomically, so all workers
+    share one budget with one query per request.
+    Twitch's rate-limit headers and 429 responses pause every caller until
+    the limit resets.
+    """
+
+    def __init__(self, rate=TWITCH_RATE_LIMIT, period=TWITCH_RATE_LIMIT_PERIOD, name='twitch'):
+        self.rate = rate
+        self.period = period
+        self.name = name
+
+    @property
+    def buckets(self):
+        model = apps.get_model('twitch_stats', 'TwitchRateLimitBucket')
+        # Always the primary, the row changes with every request.
+        return model.objects.using(router.db_for_write(model)).filter(name=self.name)
+
+    def refill(self, now):
+        """
+        Expression of the tokens added to the bucket since its last update.
+        """
+        elapsed = Greatest(Value(now, output_field=FloatField()) - F('updated'), Value(0.0, output_field=FloatField()))
+        return elapsed * (self.rate / self.period)
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent.
+        """
+        while True:
+            wait = self.take()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def take(self):
+        """
+        Takes a token, returns 0 or the seconds to wait before trying again.
+        """
+        now = time.time()
+        refill = self.refill(now)
+        tokens = Least(Value(float(self.rate), output_field=FloatField()), F('tokens') + refill)
+        if self.buckets.filter(blocked_until__lte=now, tokens__gte=1 - refill).update(tokens=tokens - 1, updated=now):
+            return 0
+        bucket = self.buckets.values('tokens', 'updated', 'blocked_until').first()
+        if bucket is None:
+            self.create_bucket(now)
+            return self.take()
+        if bucket['blocked_until'] > now:
+            return bucket['blocked_until'] - now
+        tokens = min(self.rate, bucket['tokens'] + max(now - bucket['updated'], 0) * self.rate / self.period)
+        return max((1 - tokens) * self.period / self.rate, 0.001)
+
+    def create_bucket(self, now):
+        try:
+            with transaction.atomic(using=self.buckets.db):
+                self.buckets.create(name=self.name, tokens=self.rate, updated=now)
+        except IntegrityError:
+            # Created by another worker in the meantime.
+            pass
+
+    def blocked_for(self):
+        bucket = self.buckets.values('blocked_until').first()
+        return max(bucket['blocked_until'] - time.time(), 0) if bucket else 0
+
+    def block(self, seconds):
+        if seconds <= 0:
+            return
+        now = time.time()
+        self.create_bucket(now)
+        self.buckets.update(blocked_until=Greatest(F('blocked_until'), Value(now + seconds)))
+
+    def update(self, response):
+        """
+        Reads rate-limit information from a response and blocks callers when
+        the limit has been hit. Returns True when the request was throttled.
+        """
+        remaining = response.headers.get('Ratelimit-Remaining')
+        reset = response.headers.get('Ratelimit-Reset')
+        reset_in = None
+        if reset:
+            try:
+                reset_in = float(reset) - time.time()
+            except ValueError:
+                pass
+
+        if response.status_code == 429:
+            retry_after = response.headers.get('Retry-After')
+            try:
+                self.block(float(retry_after))
+            except (TypeError, ValueError):
+                self.block(reset_in if reset_in and reset_in > 0 else self.period)
+            return True
+        if remaining == '0' and reset_in:
+            self.block(reset_in)
+        return False
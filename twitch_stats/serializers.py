@@ -1,6 +1,8 @@
 from rest_framework import serializers
 
-from twitch_stats.models import TwitchProfile, TwitchTrackingProfile, TwitchStats
+from twitch_stats.models import TwitchProfile, TwitchTrackingProfile, TwitchStats, TwitchStatsSample, \
+    TwitchStatsRollup, TwitchLatestStats
+from twitch_stats.settings import TWITCH_TRACKING_BULK_LIMIT
 
 
 class TwitchProfileSerializer(serializers.HyperlinkedModelSerializer):
@@ -37,6 +39,28 @@ class TwitchAddTrackingSerializer(serializers.Serializer):
         pass
 
 
+class TwitchBulkTrackingSerializer(serializers.Serializer):
+    """
+    Serializer for adding and removing many tracked users at once.
+    """
+    add = serializers.ListField(child=serializers.CharField(max_length=254), default=list)
+    remove = serializers.ListField(child=serializers.CharField(max_length=254), default=list)
+
+    def validate(self, attrs):
+        if not attrs['add'] and not attrs['remove']:
+            raise serializers.ValidationError('Nothing to add or remove.')
+        if len(attrs['add']) + len(attrs['remove']) > TWITCH_TRACKING_BULK_LIMIT:
+            raise serializers.ValidationError('At most {} users can be changed at once.'
+                                              .format(TWITCH_TRACKING_BULK_LIMIT))
+        return attrs
+
+    def create(self, validated_data):
+        pass
+
+    def update(self, instance, validated_data):
+        pass
+
+
 class TwitchTrackingSerializer(serializers.HyperlinkedModelSerializer):
     """
     Serializer for displaying tracked users by a profile.
@@ -44,7 +68,8 @@ class TwitchTrackingSerializer(serializers.HyperlinkedModelSerializer):
 
     class Meta:
         model = TwitchTrackingProfile
-        fields = ('twitch_id',)
+        fields = ('twitch_id', 'twitch_name', 'status')
+        read_only_fields = ('twitch_name', 'status')
 
 
 class TwitchStatsSerializer(serializers.HyperlinkedModelSerializer):
@@ -58,6 +83,44 @@ class TwitchStatsSerializer(serializers.HyperlinkedModelSerializer):
                   'total_views', 'total_followers', 'created')  #
 
 
+class TwitchStatsSampleSerializer(serializers.HyperlinkedModelSerializer):
+    """
+    Serializer for retrieving Twitch Stats stored in the delta mode, in the same shape as TwitchStatsSerializer.
+    """
+    channel_id = serializers.CharField(source='stream.channel_id')
+    stream_id = serializers.CharField(source='stream.stream_id')
+    channel_status = serializers.CharField(source='stream.channel_status')
+    game = serializers.CharField(source='stream.game')
+
+    class Meta:
+        model = TwitchStatsSample
+        fields = TwitchStatsSerializer.Meta.fields
+
+
+class TwitchStatsRollupSerializer(serializers.HyperlinkedModelSerializer):
+    """
+    Serializer for retrieving aggregated Twitch Stats.
+    """
+    avg_viewers = serializers.FloatField(read_only=True)
+    followers_delta = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = TwitchStatsRollup
+        fields = ('channel_id', 'resolution', 'bucket', 'min_viewers', 'max_viewers', 'avg_viewers',
+                  'followers_delta', 'samples')
+
+
+class TwitchLatestStatsSerializer(serializers.HyperlinkedModelSerializer):
+    """
+    Serializer for the current state of tracked channels.
+    """
+
+    class Meta:
+        model = TwitchLatestStats
+        fields = ('channel_id', 'is_live', 'stream_id', 'channel_status', 'game', 'current_viewers',
+                  'total_views', 'total_followers', 'went_live', 'updated')
+
+
 class TrackingSchedulerSerializer(serializers.Serializer):
     """
     Serializer for starting and stopping stats collection scheduled task.
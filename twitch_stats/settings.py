@@ -10,6 +10,87 @@ TWITCH_CLIENT_SECRET = os.environ.get('TWITCH_CLIENT_SECRET', '')
 TWITCH_REDIRECT_URI = "https://hoff.pw/twitch/callback"
 TWITCH_VERSION_HEADERS = "application/vnd.twitchtv.v5+json"
 
+# Twitch API client settings
+# Connections kept alive per worker process and timeout (seconds) for each call.
+TWITCH_API_POOL_SIZE = int(os.environ.get('TWITCH_API_POOL_SIZE', 12))
+TWITCH_API_TIMEOUT = float(os.environ.get('TWITCH_API_TIMEOUT', 10))
+# Times a throttled (429) call is retried once the limit resets.
+TWITCH_API_MAX_RETRIES = int(os.environ.get('TWITCH_API_MAX_RETRIES', 3))
+
+# Rate limit settings
+# Requests allowed per period across all workers. The budget is a token bucket
+# kept in one TwitchRateLimitBucket row of the primary database.
+TWITCH_RATE_LIMIT = int(os.environ.get('TWITCH_RATE_LIMIT', 30))
+TWITCH_RATE_LIMIT_PERIOD = int(os.environ.get('TWITCH_RATE_LIMIT_PERIOD', 1))
+
+# Stats collection settings
+# Number of channels fetched per streams request (the API accepts at most 100).
+TWITCH_STREAMS_BATCH_SIZE = int(os.environ.get('TWITCH_STREAMS_BATCH_SIZE', 100))
+# Number of collection shards. Each shard has its own periodic task and queue
+# (twitch_stats.shard<n>) consumed by its own worker.
+TWITCH_COLLECTION_SHARDS = int(os.environ.get('TWITCH_COLLECTION_SHARDS', 1))
+# Engine used by get_all_stats: 'tasks' fans out Celery tasks, 'greenpool' polls from one process.
+TWITCH_COLLECTOR_ENGINE = os.environ.get('TWITCH_COLLECTOR_ENGINE', 'tasks')
+# Seconds over which get_all_stats spreads the requests of one cycle.
+TWITCH_COLLECTION_SPREAD = int(os.environ.get('TWITCH_COLLECTION_SPREAD', 45))
+# Maximum number of streams requests in flight for the greenpool collector, at most
+# TWITCH_API_POOL_SIZE so every request gets a kept-alive connection.
+TWITCH_COLLECTOR_CONCURRENCY = int(os.environ.get('TWITCH_COLLECTOR_CONCURRENCY', 10))
+# Seconds between polls of a live channel, should match the collection schedule.
+# Offline channels back off exponentially up to TWITCH_POLL_MAX_INTERVAL seconds.
+TWITCH_POLL_INTERVAL = int(os.environ.get('TWITCH_POLL_INTERVAL', 60))
+TWITCH_POLL_MAX_INTERVAL = int(os.environ.get('TWITCH_POLL_MAX_INTERVAL', 900))
+# How snapshots are stored: 'full' writes a TwitchStats row per poll, 'delta'
+# writes TwitchStatsSample rows and a TwitchStream version only on metadata changes.
+TWITCH_STATS_STORAGE = os.environ.get('TWITCH_STATS_STORAGE', 'full')
+
+# Rollup settings
+# Snapshots aggregated per batch, minutes between rollup updates and seconds a
+# snapshot has to age before it is aggregated.
+TWITCH_ROLLUP_BATCH_SIZE = int(os.environ.get('TWITCH_ROLLUP_BATCH_SIZE', 10000))
+TWITCH_ROLLUP_INTERVAL = int(os.environ.get('TWITCH_ROLLUP_INTERVAL', 5))
+TWITCH_ROLLUP_LAG = int(os.environ.get('TWITCH_ROLLUP_LAG', 60))
+
+# Retention settings
+# Days raw snapshots (TwitchStats or delta samples) are kept, 0 keeps them forever.
+# Deleting history is opt-in, the daily retention task only maintains partitions by default.
+TWITCH_STATS_RAW_RETENTION_DAYS = int(os.environ.get('TWITCH_STATS_RAW_RETENTION_DAYS', 0))
+# Days rollups of each resolution are kept, 0 keeps them forever.
+TWITCH_ROLLUP_RETENTION_DAYS = {
+    '5m': int(os.environ.get('TWITCH_ROLLUP_5M_RETENTION_DAYS', 180)),
+    '1h': int(os.environ.get('TWITCH_ROLLUP_1H_RETENTION_DAYS', 730)),
+    '1d': int(os.environ.get('TWITCH_ROLLUP_1D_RETENTION_DAYS', 0)),
+}
+# Months of partitions created ahead of time on Postgres.
+TWITCH_STATS_PARTITIONS_AHEAD = int(os.environ.get('TWITCH_STATS_PARTITIONS_AHEAD', 2))
+
+# User directory settings
+# Cache alias shared by all processes (an empty value keeps lookups in process
+# memory only, hoffpw.checks refuses a process-local backend), seconds users and
+# missing users are cached and entries per process.
+TWITCH_DIRECTORY_CACHE = os.environ.get('TWITCH_DIRECTORY_CACHE', 'default') or None
+TWITCH_DIRECTORY_TTL = int(os.environ.get('TWITCH_DIRECTORY_TTL', 86400))
+TWITCH_DIRECTORY_NEGATIVE_TTL = int(os.environ.get('TWITCH_DIRECTORY_NEGATIVE_TTL', 600))
+TWITCH_DIRECTORY_MAX_SIZE = int(os.environ.get('TWITCH_DIRECTORY_MAX_SIZE', 10000))
+
+# Tracking settings
+# Maximum number of channels added or removed by one bulk tracking request.
+TWITCH_TRACKING_BULK_LIMIT = int(os.environ.get('TWITCH_TRACKING_BULK_LIMIT', 500))
+# Cache alias of the locks that queue each pending id for verification once,
+# shared so a worker releases the lock taken by a web process.
+TWITCH_VERIFY_CACHE = os.environ.get('TWITCH_VERIFY_CACHE', 'default')
+# Minutes between sweeps that queue pending ids whose verification was lost.
+TWITCH_VERIFY_REQUEUE_INTERVAL = int(os.environ.get('TWITCH_VERIFY_REQUEUE_INTERVAL', 5))
+
+# Stats API settings
+# Cache alias and seconds a stats response is cached, responses are also
+# invalidated as soon as new stats of the channel are written. The alias holds
+# the channel versions written by the workers, so it has to be shared.
+TWITCH_STATS_CACHE = os.environ.get('TWITCH_STATS_CACHE', 'default')
+TWITCH_STATS_CACHE_TTL = int(os.environ.get('TWITCH_STATS_CACHE_TTL', 300))
+# Rows read per query while streaming a history export.
+TWITCH_EXPORT_CHUNK_SIZE = int(os.environ.get('TWITCH_EXPORT_CHUNK_SIZE', 5000))
+
 
 """
     God token used for testing is a random token that allows to do
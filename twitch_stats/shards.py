@@ -0,0 +1,37 @@
+"""
+    Stable assignment of tracked channels to collection shards.
+
+    Every channel gets one of SHARD_BUCKETS buckets from a hash of its twitch
+    id, stored on the profile. Buckets are mapped to shards with jump
+    consistent hashing, so changing TWITCH_COLLECTION_SHARDS from n to n + 1
+    only moves 1/(n + 1) of the channels.
+"""
+import zlib
+
+from .settings import TWITCH_COLLECTION_SHARDS
+
+SHARD_BUCKETS = 1024
+
+
+def shard_bucket(twitch_id):
+    return zlib.crc32(str(twitch_id).encode('utf-8')) % SHARD_BUCKETS
+
+
+def jump_hash(key, num_shards):
+    """
+    Jump consistent hash (Lamping and Veach) of an integer key.
+    """
+    shard, j = -1, 0
+    while j < num_shards:
+        shard = j
+        key = (key * 2862933555777941757 + 1) % 2 ** 64
+        j = int((shard + 1) * (2 ** 31 / ((key >> 33) + 1)))
+    return shard
+
+
+def shard_buckets(shard, shards=TWITCH_COLLECTION_SHARDS):
+    return [bucket for bucket in range(SHARD_BUCKETS) if jump_hash(bucket, shards) == shard]
+
+
+def shard_queue(shard):
+    return 'twitch_stats.shard{}'.format(shard)
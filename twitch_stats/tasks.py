@@ -1,22 +1,52 @@
 from __future__ import absolute_import, unicode_literals
 
+import requests
 from celery import group
 from celery import shared_task
 from celery.signals import eventlet_pool_started
+from django.core.cache import caches
 
-from twitch_stats.models import TwitchTrackingProfile, TwitchStats
+from twitch_stats.collector import StatsCollector
+from twitch_stats.models import TwitchTrackingProfile, TwitchStats, TwitchStatsRollup
+from twitch_stats.settings import TWITCH_STREAMS_BATCH_SIZE, TWITCH_COLLECTOR_ENGINE, TWITCH_COLLECTION_SPREAD, \
+    TWITCH_COLLECTION_SHARDS, TWITCH_VERIFY_CACHE, TWITCH_TRACKING_BULK_LIMIT
+from twitch_stats.shards import shard_queue
 
 
 @eventlet_pool_started.connect()
 def start_task(**kwargs):
-    get_all_stats.s().apply_async()
+    """
+    Starts collecting for the queues this worker consumes, so every shard is
+    kicked once by its own worker instead of by every worker that boots.
+    """
+    app = get_all_stats.app
+    queues = app.amqp.queues
+    # Without -Q the worker consumes every declared queue.
+    consumed = queues.consume_from if queues.consume_from is not None else queues
+    if TWITCH_COLLECTION_SHARDS == 1:
+        if app.conf.task_default_queue in consumed:
+            get_all_stats.s().apply_async()
+        return
+    for shard in range(TWITCH_COLLECTION_SHARDS):
+        if shard_queue(shard) in consumed:
+            get_all_stats.s(shard).apply_async(queue=shard_queue(shard))
 
 
 @shared_task()
-def get_all_stats():
-    objects = TwitchTrackingProfile.objects.all()
-    object_list = list(objects)
-    job = group(get_stats_by_id.s(obj.twitch_id) for obj in object_list)
+def get_all_stats(shard=None):
+    """
+    Collects stats of the due channels, only the ones of `shard` when given.
+    Requests of a shard are queued on the shard's queue.
+    """
+    if TWITCH_COLLECTOR_ENGINE == 'greenpool':
+        return collect_all_stats(shard)
+    twitch_ids = TwitchTrackingProfile.objects.due_ids(shard=shard)
+    chunks = [twitch_ids[i:i + TWITCH_STREAMS_BATCH_SIZE]
+              for i in range(0, len(twitch_ids), TWITCH_STREAMS_BATCH_SIZE)]
+    # Spread the requests over the cycle instead of sending them all at once.
+    step = TWITCH_COLLECTION_SPREAD / len(chunks) if chunks else 0
+    options = {'queue': shard_queue(shard)} if shard is not None and TWITCH_COLLECTION_SHARDS > 1 else {}
+    job = group(get_stats_by_ids.s(chunk).set(countdown=i * step, **options) for i, chunk in enumerate(chunks))
     job.apply_async()
 
 
@@ -25,6 +55,72 @@ def get_stats_by_id(tid):
     TwitchStats.objects.get_stats(twitch_id=tid)
 
 
+@shared_task()
+def get_stats_by_ids(tids):
+    TwitchStats.objects.get_stats_batch(twitch_ids=tids)
+
+
+@shared_task()
+def collect_all_stats(shard=None):
+    return StatsCollector(shard=shard).run_cycle()
+
+
+@shared_task()
+def update_rollups():
+    return TwitchStatsRollup.objects.update_rollups()
+
+
+@shared_task()
+def apply_retention():
+    TwitchStats.objects.apply_retention()
+    TwitchStatsRollup.objects.apply_retention()
+
+
+VERIFY_LOCK_KEY = 'twitch_stats:verify:{}'
+VERIFY_LOCK_TIMEOUT = 300
+
+
+def queue_verification(twitch_ids):
+    """
+    Queues verification of pending twitch ids. Ids already queued by another
+    request are skipped, so concurrent requests for one id verify it once.
+    """
+    cache = caches[TWITCH_VERIFY_CACHE]
+    queued = [twitch_id for twitch_id in twitch_ids
+              if cache.add(VERIFY_LOCK_KEY.format(twitch_id), 1, VERIFY_LOCK_TIMEOUT)]
+    if queued:
+        verify_tracking_profiles.delay(queued)
+    return queued
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def verify_tracking_profiles(self, twitch_ids):
+    cache = caches[TWITCH_VERIFY_CACHE]
+    try:
+        TwitchTrackingProfile.objects.verify_pending(t_ids=twitch_ids)
+    except requests.RequestException as e:
+        if self.request.retries < self.max_retries:
+            # Keep the ids locked while the retry is scheduled.
+            raise self.retry(exc=e)
+        cache.delete_many([VERIFY_LOCK_KEY.format(twitch_id) for twitch_id in twitch_ids])
+        raise
+    cache.delete_many([VERIFY_LOCK_KEY.format(twitch_id) for twitch_id in twitch_ids])
+
+
+@shared_task()
+def requeue_pending_verifications():
+    """
+    Queues the pending ids that are not being verified, e.g. after the task was
+    lost with its worker or gave up retrying. Ids whose lock is held are skipped
+    until the lock expires.
+    """
+    twitch_ids = TwitchTrackingProfile.objects.pending_ids()
+    queued = []
+    for i in range(0, len(twitch_ids), TWITCH_TRACKING_BULK_LIMIT):
+        queued += queue_verification(twitch_ids[i:i + TWITCH_TRACKING_BULK_LIMIT])
+    return queued
+
+
 @shared_task()
 def get_track():
     objects = TwitchStats.objects.all()
@@ -0,0 +1,527 @@
+import csv
+import json
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import requests
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from twitch_stats import tasks
+from twitch_stats.collector import StatsCollector
+from twitch_stats.directory import directory
+from twitch_stats.models import TwitchProfile, TwitchTrackingProfile, TwitchStats, TwitchStream, TwitchStatsSample, \
+    TwitchStatsRollup, TwitchStatsRollupWatermark
+from twitch_stats.ratelimit import RateLimiter
+from twitch_stats.serializers import TwitchStatsSerializer
+from twitch_stats.shards import shard_bucket
+from webauth.models import User
+
+
+def make_stream(channel_id='12345', stream_id='1', viewers=10):
+    """
+    Builds a stream object as returned by the streams endpoint.
+    """
+    return {
+        '_id': stream_id, 'game': 'Game', 'delay': 0, 'created_at': '2017-02-26T11:30:00Z', 'average_fps': 60,
+        'viewers': viewers, 'is_playlist': False,
+        'channel': {'_id': channel_id, 'status': 'Status', 'mature': False, 'broadcaster_language': 'en',
+                    'partner': False, 'views': 100, 'followers': 10},
+    }
+
+
+class TwitchProfileTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='test_user', email='test@email.com', password='test_password')
+        self.profile = self.create_profile(user=self.user, twitch_id='12345', twitch_name='test_streamer')
+
+    @staticmethod
+    def create_profile(user, twitch_id, twitch_name):
+        return TwitchProfile.objects.create(twitch_id=twitch_id, twitch_name=twitch_name, twitch_display=twitch_name,
+                                            twitch_email='twitch@email.com', twitch_user_type='user',
+                                            twitch_created=timezone.now(), authorization_code='code',
+                                            access_token='token', scopes='', user=user)
+
+    def test_resolve_uuid(self):
+        """
+        Ensure a profile is resolved from the user uuid with one query.
+        """
+        with self.assertNumQueries(1):
+            obj = TwitchProfile.objects.get_from_id_or_username_or_uuid(identifier=str(self.user.uuid))
+        self.assertEqual(obj, self.profile)
+
+    def test_resolve_username(self):
+        """
+        Ensure a profile is resolved from the twitch name with one query.
+        """
+        with self.assertNumQueries(1):
+            obj = TwitchProfile.objects.get_from_id_or_username_or_uuid(identifier='Test_Streamer')
+        self.assertEqual(obj, self.profile)
+
+    def test_resolve_id(self):
+        """
+        Ensure a profile is resolved from the twitch id with one query.
+        """
+        with self.assertNumQueries(1):
+            obj = TwitchProfile.objects.get_from_id_or_username_or_uuid(identifier='12345')
+        self.assertEqual(obj, self.profile)
+
+    def test_resolve_numeric_name_first(self):
+        """
+        Ensure a numeric twitch name takes precedence over a matching twitch id.
+        """
+        user = User.objects.create_user(username='other_user', email='other@email.com', password='test_password')
+        other = self.create_profile(user=user, twitch_id='999', twitch_name='12345')
+        obj = TwitchProfile.objects.get_from_id_or_username_or_uuid(identifier='12345')
+        self.assertEqual(obj, other)
+
+    def test_resolve_missing(self):
+        """
+        Ensure a miss costs a single query.
+        """
+        with self.assertNumQueries(1):
+            obj = TwitchProfile.objects.get_from_id_or_username_or_uuid(identifier='missing')
+        self.assertIsNone(obj)
+
+
+class TwitchStatsTests(APITestCase):
+    @mock.patch('twitch_stats.managers.get_client')
+    def test_stats_batch(self, get_client):
+        """
+        Ensure a batch of channels is polled with one streams request and saved with one insert.
+        """
+        get_client.return_value.get_streams.return_value = [make_stream(channel_id='1'), make_stream(channel_id='2')]
+        with CaptureQueriesContext(connection) as queries:
+            live = TwitchStats.objects.get_stats_batch(twitch_ids=['1', '2', '3'])
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "twitch_stats_twitchstats"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(live, 2)
+        get_client.return_value.get_streams.assert_called_once_with(['1', '2', '3'])
+        self.assertEqual(sorted(TwitchStats.objects.values_list('channel_id', flat=True)), ['1', '2'])
+
+    @mock.patch('twitch_stats.views.TWITCH_STATS_STORAGE', 'delta')
+    @mock.patch('twitch_stats.managers.TWITCH_STATS_STORAGE', 'delta')
+    def test_delta_storage(self):
+        """
+        Ensure the delta mode stores a new stream version only when metadata changes.
+        """
+        TwitchStats.objects.save_streams([make_stream(viewers=10)])
+        TwitchStats.objects.save_streams([make_stream(viewers=20)])
+        stream = make_stream(viewers=30)
+        stream['game'] = 'Other'
+        TwitchStats.objects.save_streams([stream])
+
+        self.assertFalse(TwitchStats.objects.exists())
+        self.assertEqual(TwitchStream.objects.count(), 2)
+        samples = list(TwitchStatsSample.objects.order_by('id'))
+        self.assertEqual([sample.stream_id for sample in samples[:2]], [samples[0].stream_id] * 2)
+        stats = samples[2].to_stats()
+        self.assertEqual((stats.channel_id, stats.game, stats.current_viewers), ('12345', 'Other', 30))
+
+        response = self.client.get('/twitch/stats/12345/')
+        self.assertEqual([(row['game'], row['current_viewers']) for row in response.data['results']],
+                         [('Game', 10), ('Game', 20), ('Other', 30)])
+
+    def add_history(self, count, created=None):
+        for viewers in range(count):
+            TwitchStats.objects.save_streams([make_stream(viewers=viewers)])
+        if created:
+            TwitchStats.objects.update(created=created)
+
+    def walk(self, url, direction):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([row['current_viewers'] for row in response.data['results']])
+            url = response.data[direction]
+        return pages
+
+    def test_pagination_ties(self):
+        """
+        Ensure every row is returned exactly once walking forward and backward when timestamps tie.
+        """
+        self.add_history(5, created=timezone.now())
+        response = self.client.get('/twitch/stats/12345/?page_size=2')
+        self.assertEqual(list(response.data), ['count', 'next', 'previous', 'results'])
+        self.assertEqual((response.data['count'], response.data['previous']), (5, None))
+
+        pages = self.walk('/twitch/stats/12345/?page_size=2', 'next')
+        self.assertEqual(pages, [[0, 1], [2, 3], [4]])
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(response.data['next'])
+        self.assertIsNone(page.data['count'])
+        self.assertFalse([query for query in queries.captured_queries if 'COUNT(' in query['sql']])
+        last = self.client.get(self.client.get(response.data['next']).data['next'])
+        self.assertEqual(self.walk(last.data['previous'], 'previous'), [[2, 3], [0, 1]])
+
+    def test_pagination_invalid_cursor(self):
+        """
+        Ensure malformed cursors are answered with 404.
+        """
+        for cursor in ('garbage', 'bmV4dHxub3QtYS1kYXRlfDE=', 'c2lkZXdheXN8MjAxNy0wMS0wMVQwMDowMDowMHwx'):
+            response = self.client.get('/twitch/stats/12345/?cursor={}'.format(cursor))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_time_range(self):
+        """
+        Ensure ?from= is inclusive, ?to= exclusive and invalid timestamps are rejected.
+        """
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.add_history(4)
+        for offset, obj in enumerate(TwitchStats.objects.order_by('id')):
+            TwitchStats.objects.filter(id=obj.id).update(created=start + timedelta(hours=offset))
+        response = self.client.get('/twitch/stats/12345/',
+                                   {'from': '2026-01-01T01:00:00Z', 'to': '2026-01-01T03:00:00Z'})
+        self.assertEqual([row['current_viewers'] for row in response.data['results']], [1, 2])
+        response = self.client.get('/twitch/stats/12345/', {'from': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retention_opt_in(self):
+        """
+        Ensure old history is kept unless a raw retention is configured.
+        """
+        self.add_history(2, created=timezone.now() - timedelta(days=400))
+        TwitchStats.objects.apply_retention()
+        self.assertEqual(TwitchStats.objects.count(), 2)
+        with mock.patch('twitch_stats.managers.TWITCH_STATS_RAW_RETENTION_DAYS', 90):
+            TwitchStats.objects.apply_retention()
+        self.assertEqual(TwitchStats.objects.count(), 0)
+
+    def test_export(self):
+        """
+        Ensure the history is streamed in order as CSV and NDJSON, across keyset chunks.
+        """
+        for viewers in (10, 20, 30):
+            TwitchStats.objects.save_streams([make_stream(viewers=viewers)])
+
+        response = self.client.get('/twitch/stats/12345/export/')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
+        self.assertEqual(rows[0], list(TwitchStatsSerializer.Meta.fields))
+        self.assertEqual([row[4] for row in rows[1:]], ['10', '20', '30'])
+
+        response = self.client.get('/twitch/stats/12345/export/?type=ndjson')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line)['current_viewers'] for line in lines], [10, 20, 30])
+
+        rows = TwitchStats.objects.iter_history(channel_id='12345', fields=['current_viewers'], chunk_size=2)
+        self.assertEqual(list(rows), [(10,), (20,), (30,)])
+
+        response = self.client.get('/twitch/stats/12345/export/?type=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch('twitch_stats.collector.get_client')
+    def test_collector_cycle(self, get_client):
+        """
+        Ensure a collector cycle polls every channel in batches and survives failed requests.
+        """
+        for twitch_id in ('1', '2', '3', '4', '5'):
+            TwitchTrackingProfile.objects.create(twitch_id=twitch_id, twitch_name=twitch_id)
+
+        def get_streams(channel_ids):
+            if channel_ids == ['5']:
+                raise requests.ConnectionError()
+            return [make_stream(channel_id=channel_id) for channel_id in channel_ids if channel_id != '2']
+        get_client.return_value.get_streams.side_effect = get_streams
+
+        result = StatsCollector(concurrency=2, batch_size=1).run_cycle()
+        self.assertEqual((result['channels'], result['requests'], result['failed'], result['live']), (5, 5, 1, 3))
+        self.assertEqual(TwitchStats.objects.filter(channel_id__in=['1', '3', '4']).count(), 3)
+
+    def test_current_stats(self):
+        """
+        Ensure the current state of tracked channels follows the latest poll.
+        """
+        user = User.objects.create_user(username='test_user', email='test@email.com', password='test_password')
+        profile = TwitchProfileTests.create_profile(user=user, twitch_id='1', twitch_name='test_streamer')
+        for twitch_id in ('12345', '67890'):
+            profile.tracking_users.add(TwitchTrackingProfile.objects.create(twitch_id=twitch_id, twitch_name=twitch_id))
+        url = '/twitch/profiles/{}/current/'.format(user.uuid)
+
+        TwitchStats.objects.save_streams([make_stream(channel_id='12345'), make_stream(channel_id='67890')],
+                                         channel_ids=['12345', '67890'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['is_live'] for row in response.data], [True, True])
+
+        TwitchStats.objects.save_streams([make_stream(channel_id='67890', viewers=50)], channel_ids=['12345', '67890'])
+        response = self.client.get(url)
+        self.assertEqual([(row['channel_id'], row['is_live'], row['current_viewers']) for row in response.data],
+                         [('67890', True, 50), ('12345', False, 0)])
+
+    def test_stats_not_modified(self):
+        """
+        Ensure unchanged stats are answered with 304 and new stats invalidate the ETag.
+        """
+        TwitchStats.objects.save_streams([make_stream()])
+        url = '/twitch/stats/12345/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        TwitchStats.objects.save_streams([make_stream(viewers=20)])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class TwitchTrackingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='test_user', email='test@email.com', password='test_password')
+        self.profile = TwitchProfileTests.create_profile(user=self.user, twitch_id='1', twitch_name='test_streamer')
+        self.url = '/twitch/profiles/{}/tracking/bulk/'.format(self.user.uuid)
+        self.client.force_authenticate(user=self.user)
+        cache.clear()
+        directory.clear()
+
+    def nested_queries(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        parent_queries = [query for query in queries.captured_queries
+                          if query['sql'].startswith('SELECT "twitch_stats_twitchprofile".')]
+        return len(queries.captured_queries), len(parent_queries)
+
+    def test_nested_parent_loaded_once(self):
+        """
+        Ensure nested retrieve and delete resolve the parent profile with a single query.
+        """
+        self.profile.tracking_users.add(TwitchTrackingProfile.objects.create(twitch_id='222', twitch_name='streamer'))
+        url = '/twitch/profiles/{}/tracking/222/'.format(self.user.uuid)
+        # Parent, directory cache and tracked profile.
+        self.assertEqual(self.nested_queries('get', url), (3, 1))
+        # Also the owner for the permission check, the unlink and the delete of the now untracked profile.
+        self.assertEqual(self.nested_queries('delete', url), (8, 1))
+
+    @mock.patch('twitch_stats.tasks.verify_tracking_profiles.delay')
+    def test_bulk_tracking(self, delay):
+        """
+        Ensure known ids are linked right away, unknown ones queued for verification and removed ones unlinked.
+        """
+        TwitchTrackingProfile.objects.create(twitch_id='111', twitch_name='known_streamer')
+        response = self.client.post(self.url, {'add': ['111', '222', '333']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data, {'added': ['111', '222', '333'], 'removed': [], 'pending': ['222', '333'],
+                                         'invalid': []})
+        delay.assert_called_once_with(['222', '333'])
+        self.assertEqual(self.profile.tracking_users.count(), 3)
+
+        response = self.client.post(self.url, {'remove': ['111']}, format='json')
+        self.assertEqual(response.data['removed'], ['111'])
+        self.assertFalse(TwitchTrackingProfile.objects.filter(twitch_id='111').exists())
+
+    @mock.patch('twitch_stats.tasks.verify_tracking_profiles.delay')
+    def test_verification_queued_once(self, delay):
+        """
+        Ensure concurrent requests for the same pending id queue a single verification.
+        """
+        url = '/twitch/profiles/{}/tracking/'.format(self.user.uuid)
+        for _ in range(2):
+            response = self.client.post(url, {'twitch_id': '222'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response.data['status'], TwitchTrackingProfile.PENDING)
+        delay.assert_called_once_with(['222'])
+
+    @mock.patch('twitch_stats.tasks.verify_tracking_profiles.delay')
+    def test_requeue_pending(self, delay):
+        """
+        Ensure the sweep queues pending ids whose verification was lost and skips the ones in flight.
+        """
+        TwitchTrackingProfile.objects.get_or_create_many(['222', '333'])
+        tasks.queue_verification(['222'])
+        delay.reset_mock()
+        self.assertEqual(tasks.requeue_pending_verifications(), ['333'])
+        delay.assert_called_once_with(['333'])
+
+        # Once the lock of a lost verification expires the id is queued again.
+        cache.delete(tasks.VERIFY_LOCK_KEY.format('222'))
+        self.assertEqual(tasks.requeue_pending_verifications(), ['222'])
+
+    @mock.patch('twitch_stats.directory.get_client')
+    def test_verify_pending(self, get_client):
+        """
+        Ensure pending profiles are verified with one users request.
+        """
+        TwitchTrackingProfile.objects.get_or_create_many(['222', '333'])
+        get_client.return_value.get_users.return_value = {'222': 'new_streamer'}
+        invalid = TwitchTrackingProfile.objects.verify_pending(['222', '333'])
+        self.assertEqual(invalid, ['333'])
+        get_client.return_value.get_users.assert_called_once_with(['222', '333'])
+        self.assertEqual(TwitchTrackingProfile.objects.get(twitch_id='222').twitch_name, 'new_streamer')
+        self.assertEqual(TwitchTrackingProfile.objects.get(twitch_id='333').status, TwitchTrackingProfile.INVALID)
+        self.assertEqual(TwitchTrackingProfile.objects.verified_ids(), ['222'])
+
+        # Both the user and the missing user are served from the directory afterwards.
+        TwitchTrackingProfile.objects.filter(twitch_id__in=['222', '333']).update(status=TwitchTrackingProfile.PENDING)
+        TwitchTrackingProfile.objects.verify_pending(['222', '333'])
+        self.assertEqual(get_client.return_value.get_users.call_count, 1)
+
+    def test_poll_backoff(self):
+        """
+        Ensure offline channels are skipped until their backoff ends and live ones are polled every cycle.
+        """
+        TwitchTrackingProfile.objects.create(twitch_id='111', twitch_name='known_streamer')
+        TwitchStats.objects.save_streams([], channel_ids=['111'])
+        self.assertEqual(TwitchTrackingProfile.objects.due_ids(), [])
+
+        TwitchStats.objects.save_streams([make_stream(channel_id='111')], channel_ids=['111'])
+        self.assertEqual(TwitchTrackingProfile.objects.due_ids(), ['111'])
+        obj = TwitchTrackingProfile.objects.get(twitch_id='111')
+        self.assertEqual((obj.offline_streak, obj.live_hours), (0, 1 << 11))
+
+    @mock.patch('twitch_stats.managers.TWITCH_COLLECTION_SHARDS', 2)
+    def test_shards(self):
+        """
+        Ensure every channel is collected by exactly one shard.
+        """
+        t_ids = [str(t_id) for t_id in range(100, 120)]
+        for obj in TwitchTrackingProfile.objects.get_or_create_many(t_ids):
+            self.assertEqual(obj.shard_bucket, shard_bucket(obj.twitch_id))
+        TwitchTrackingProfile.objects.update(status=TwitchTrackingProfile.VERIFIED)
+        first, second = TwitchTrackingProfile.objects.due_ids(shard=0), TwitchTrackingProfile.objects.due_ids(shard=1)
+        self.assertTrue(first and second)
+        self.assertEqual(sorted(first + second), t_ids)
+
+    @mock.patch('twitch_stats.tasks.TWITCH_COLLECTION_SHARDS', 3)
+    @mock.patch('twitch_stats.tasks.get_all_stats')
+    def test_start_consumed_shards(self, get_all_stats):
+        """
+        Ensure a booting worker only starts collecting for the shard queues it consumes.
+        """
+        get_all_stats.app.amqp.queues.consume_from = {'celery': None, 'twitch_stats.shard1': None}
+        tasks.start_task()
+        get_all_stats.s.assert_called_once_with(1)
+        get_all_stats.s.return_value.apply_async.assert_called_once_with(queue='twitch_stats.shard1')
+
+
+class Sleep(Exception):
+    pass
+
+
+class RateLimiterTests(TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(rate=2, period=3600)
+
+    @staticmethod
+    def make_response(status_code=200, **headers):
+        return mock.Mock(status_code=status_code, headers=headers)
+
+    @mock.patch('twitch_stats.ratelimit.time.sleep', side_effect=Sleep)
+    def test_window(self, sleep):
+        """
+        Ensure at most `rate` requests are handed out per window.
+        """
+        self.limiter.acquire()
+        self.limiter.acquire()
+        with self.assertRaises(Sleep):
+            self.limiter.acquire()
+
+    def test_one_query_per_request(self):
+        """
+        Ensure taking a token from an existing bucket is a single query.
+        """
+        self.limiter.acquire()
+        with self.assertNumQueries(1):
+            self.limiter.acquire()
+
+    @mock.patch('twitch_stats.ratelimit.time.time')
+    def test_refill(self, now):
+        """
+        Ensure the bucket refills at rate/period and tells callers how long to wait.
+        """
+        now.return_value = 1000.0
+        self.assertEqual(self.limiter.take(), 0)
+        self.assertEqual(self.limiter.take(), 0)
+        self.assertAlmostEqual(self.limiter.take(), 1800)
+        now.return_value = 1000.0 + 1800
+        self.assertEqual(self.limiter.take(), 0)
+        self.assertAlmostEqual(self.limiter.take(), 1800)
+
+    def test_retry_after(self):
+        """
+        Ensure a 429 blocks callers for Retry-After seconds and is reported as throttled.
+        """
+        self.assertTrue(self.limiter.update(self.make_response(status_code=429, **{'Retry-After': '5'})))
+        self.assertTrue(4 < self.limiter.blocked_for() <= 5)
+
+    def test_remaining_exhausted(self):
+        """
+        Ensure callers are blocked until the reset once no requests remain.
+        """
+        response = self.make_response(**{'Ratelimit-Remaining': '0', 'Ratelimit-Reset': str(time.time() + 10)})
+        self.assertFalse(self.limiter.update(response))
+        self.assertTrue(9 < self.limiter.blocked_for() <= 10)
+
+        self.assertFalse(self.limiter.update(self.make_response(**{'Ratelimit-Remaining': '5'})))
+        self.assertTrue(self.limiter.blocked_for() > 0)
+
+
+class TwitchStatsRollupTests(APITestCase):
+    @staticmethod
+    def add_stats(created, viewers, followers):
+        stream = make_stream(viewers=viewers)
+        stream['channel']['followers'] = followers
+        TwitchStats.objects.save_streams([stream])
+        obj = TwitchStats.objects.latest('id')
+        TwitchStats.objects.filter(id=obj.id).update(created=created)
+        return obj.id
+
+    def test_incremental_merge(self):
+        """
+        Ensure rows are merged into existing buckets over separate runs and the watermark advances.
+        """
+        start = datetime(2026, 1, 1, 10, 0, tzinfo=timezone.utc)
+        first = self.add_stats(start + timedelta(minutes=1), viewers=10, followers=100)
+        self.assertEqual(TwitchStatsRollup.objects.update_rollups(), 1)
+        self.assertEqual(TwitchStatsRollupWatermark.objects.get(name='full').last_id, first)
+
+        self.add_stats(start + timedelta(minutes=2), viewers=30, followers=110)
+        last = self.add_stats(start + timedelta(minutes=7), viewers=50, followers=120)
+        self.assertEqual(TwitchStatsRollup.objects.update_rollups(batch_size=1), 2)
+        self.assertEqual(TwitchStatsRollupWatermark.objects.get(name='full').last_id, last)
+        self.assertEqual(TwitchStatsRollup.objects.update_rollups(), 0)
+
+        rollup = TwitchStatsRollup.objects.get(resolution='5m', bucket=start)
+        self.assertEqual((rollup.samples, rollup.min_viewers, rollup.max_viewers, rollup.avg_viewers,
+                          rollup.followers_delta), (2, 10, 30, 20, 10))
+        rollup = TwitchStatsRollup.objects.get(resolution='1h', bucket=start)
+        self.assertEqual((rollup.samples, rollup.max_viewers, rollup.followers_delta), (3, 50, 20))
+        self.assertEqual(TwitchStatsRollup.objects.filter(resolution='5m').count(), 2)
+
+    def test_lag_cutoff(self):
+        """
+        Ensure rows younger than the lag are left for a later run.
+        """
+        TwitchStats.objects.save_streams([make_stream()])
+        self.assertEqual(TwitchStatsRollup.objects.update_rollups(), 0)
+        self.assertFalse(TwitchStatsRollup.objects.exists())
+        self.assertFalse(TwitchStatsRollupWatermark.objects.filter(last_id__gt=0).exists())
+
+    def test_resolution_api(self):
+        """
+        Ensure rollups are served with ?resolution= and unknown resolutions are rejected.
+        """
+        start = datetime(2026, 1, 1, 10, 0, tzinfo=timezone.utc)
+        self.add_stats(start + timedelta(minutes=1), viewers=10, followers=100)
+        self.add_stats(start + timedelta(minutes=2), viewers=30, followers=110)
+        TwitchStatsRollup.objects.update_rollups()
+
+        response = self.client.get('/twitch/stats/12345/?resolution=1h')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['avg_viewers'], row['samples'], row['followers_delta'])
+                          for row in response.data['results']], [(20, 2, 10)])
+
+        response = self.client.get('/twitch/stats/12345/?resolution=2h')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
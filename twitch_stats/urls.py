@@ -2,7 +2,8 @@ from django.conf.urls import include
 from django.conf.urls import url
 from rest_framework_nested import routers
 
-from twitch_stats.views import TwitchProfileViewSet, TwitchTrackingProfileViewSet, TrackingView, TwitchStatsViewSet
+from twitch_stats.views import TwitchProfileViewSet, TwitchTrackingProfileViewSet, TrackingView, TwitchStatsViewSet, \
+    TwitchStatsExportView
 
 router = routers.DefaultRouter()
 router.register(r'profiles', TwitchProfileViewSet)
@@ -14,5 +15,6 @@ twitch_patterns = [
     url(r'', include(router.urls)),
     url(r'', include(profile_router.urls)),
     url(r'stats/(?P<pk>[^/.]+)/$', TwitchStatsViewSet.as_view({'get': 'list'})),
+    url(r'stats/(?P<pk>[^/.]+)/export/$', TwitchStatsExportView.as_view()),
     url(r'settings/tracking/$', TrackingView.as_view()),
 ]
\ No newline at end of file
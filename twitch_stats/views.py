@@ -1,18 +1,54 @@
+import csv
+import hashlib
+import json
+
 from django.core import serializers
-from django.http import Http404
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_http_date_safe
 from rest_framework import mixins
 from rest_framework import status
 from rest_framework import viewsets
+from rest_framework.decorators import detail_route, list_route
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from twitch_stats.models import TwitchProfile, TwitchTrackingProfile, TwitchStats
+from twitch_stats.models import TwitchProfile, TwitchTrackingProfile, TwitchStats, TwitchStatsSample, \
+    TwitchStatsRollup, TwitchLatestStats
 from twitch_stats.serializers import TwitchProfileSerializer, TwitchProfileRegisterSerializer, \
-    TwitchAddTrackingSerializer, TwitchTrackingSerializer, TrackingSchedulerSerializer, TwitchStatsSerializer
+    TwitchAddTrackingSerializer, TwitchBulkTrackingSerializer, TwitchTrackingSerializer, TrackingSchedulerSerializer, \
+    TwitchStatsSerializer, TwitchStatsSampleSerializer, TwitchStatsRollupSerializer, TwitchLatestStatsSerializer
 
+from twitch_stats.mixins import NestedParentMixin
+from twitch_stats.pagination import KeysetPagination
 from twitch_stats.permissions import IsOwnerOrReadOnly
-from twitch_stats.settings import GOD_TOKEN
+from twitch_stats.cache import get_channel_version
+from twitch_stats.tasks import queue_verification
+from twitch_stats.settings import GOD_TOKEN, TWITCH_STATS_STORAGE, TWITCH_STATS_CACHE, TWITCH_STATS_CACHE_TTL
+
+
+def parse_time_range(query_params):
+    """
+    Returns the (from, to) timestamps of a request, None for missing ones.
+    """
+    bounds = []
+    for param in ('from', 'to'):
+        value = query_params.get(param)
+        if value is None:
+            bounds.append(None)
+            continue
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({param: 'Must be an ISO 8601 timestamp.'})
+        bounds.append(parsed)
+    return bounds
 
 
 class TwitchProfileViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.CreateModelMixin,
@@ -36,6 +72,15 @@ class TwitchProfileViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mix
         else:
             return Response({"detail": "Not authorized."}, status=status.HTTP_401_UNAUTHORIZED)
 
+    @detail_route(methods=['get'], serializer_class=TwitchLatestStatsSerializer)
+    def current(self, request, pk=None):
+        """
+        Current state of every channel tracked by the profile, live channels first.
+        """
+        profile = self.get_object()
+        serializer = self.get_serializer(TwitchLatestStats.objects.for_profile(profile=profile), many=True)
+        return Response(serializer.data)
+
     def get_object(self):
         try:
             identifier = self.kwargs['pk']
@@ -60,11 +105,14 @@ class TwitchProfileViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mix
             return TwitchProfile.objects.none()
 
 
-class TwitchTrackingProfileViewSet(viewsets.GenericViewSet, mixins.ListModelMixin, mixins.DestroyModelMixin,
-                                   mixins.CreateModelMixin, mixins.RetrieveModelMixin):
+class TwitchTrackingProfileViewSet(NestedParentMixin, viewsets.GenericViewSet, mixins.ListModelMixin,
+                                   mixins.DestroyModelMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin):
     queryset = TwitchTrackingProfile.objects.all()
     serializer_class = TwitchTrackingSerializer
     permission_classes = [AllowAny, IsOwnerOrReadOnly]
+    parent_lookup_kwarg = 'profiles_pk'
+    parent_model = TwitchProfile
+    parent_lookup = 'get_from_id_or_username_or_uuid'
 
     def create(self, request, profile_pk=None, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -72,14 +120,39 @@ class TwitchTrackingProfileViewSet(viewsets.GenericViewSet, mixins.ListModelMixi
         self.check_object_permissions(request=request, obj=parent)
         if serializer.is_valid(raise_exception=True):
             obj = TwitchTrackingProfile.objects.get_or_create(t_id=serializer.validated_data['twitch_id'])
-            if obj:
-                parent.tracking_users.add(obj)
-                parent.save()
-                return Response({'detail': 'Successfully added user to tracking list.'}, status=status.HTTP_200_OK)
-            else:
+            if obj.status == TwitchTrackingProfile.INVALID:
                 return Response({'detail': 'Error in verifying twitch user.'}, status=status.HTTP_400_BAD_REQUEST)
+            parent.tracking_users.add(obj)
+            if obj.status == TwitchTrackingProfile.PENDING:
+                queue_verification([obj.twitch_id])
+                return Response({'detail': 'Verifying twitch user.', 'twitch_id': obj.twitch_id, 'status': obj.status},
+                                status=status.HTTP_202_ACCEPTED)
+            return Response({'detail': 'Successfully added user to tracking list.'}, status=status.HTTP_200_OK)
         return Response({'detail': 'Something went wrong.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @list_route(methods=['post'], serializer_class=TwitchBulkTrackingSerializer)
+    def bulk(self, request, *args, **kwargs):
+        """
+        Adds (`add`) and removes (`remove`) lists of twitch ids in one request.
+        Responds with 202 when some of the added ids are still being verified.
+        """
+        parent = self.get_parent()
+        self.check_object_permissions(request=request, obj=parent)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        removed = TwitchTrackingProfile.objects.remove_many(t_ids=serializer.validated_data['remove'], user=parent)
+        profiles = TwitchTrackingProfile.objects.get_or_create_many(t_ids=serializer.validated_data['add'])
+        added = [obj for obj in profiles if obj.status != TwitchTrackingProfile.INVALID]
+        parent.tracking_users.add(*added)
+        pending = [obj.twitch_id for obj in added if obj.status == TwitchTrackingProfile.PENDING]
+        queue_verification(pending)
+        return Response({
+            'added': [obj.twitch_id for obj in added],
+            'removed': removed,
+            'pending': pending,
+            'invalid': [obj.twitch_id for obj in profiles if obj.status == TwitchTrackingProfile.INVALID],
+        }, status=status.HTTP_202_ACCEPTED if pending else status.HTTP_200_OK)
+
     def destroy(self, request, *args, **kwargs):
         parent = self.get_parent()
         self.check_object_permissions(request=request, obj=parent)
@@ -97,24 +170,15 @@ class TwitchTrackingProfileViewSet(viewsets.GenericViewSet, mixins.ListModelMixi
         except KeyError:
             raise Http404
         parent = self.get_parent()
-        obj = TwitchTrackingProfile.objects.get_from_id_or_name_with_user(identifier=identifier, user=parent)
+        obj = self.get_request_cached(
+            ('object', parent.pk, identifier),
+            lambda: TwitchTrackingProfile.objects.get_from_id_or_name_with_user(identifier=identifier, user=parent))
         if obj:
             self.check_object_permissions(request=self.request, obj=parent)
             return obj
         else:
             raise Http404
 
-    def get_parent(self):
-        try:
-            identifier = self.kwargs['profiles_pk']
-        except KeyError:
-            raise Http404
-        obj = TwitchProfile.objects.get_from_id_or_username_or_uuid(identifier=identifier)
-        if obj:
-            return obj
-        else:
-            raise Http404
-
     def get_queryset(self):
         obj = self.get_parent()
         if obj:
@@ -123,12 +187,127 @@ class TwitchTrackingProfileViewSet(viewsets.GenericViewSet, mixins.ListModelMixi
             return TwitchTrackingProfile.objects.none()
 
 class TwitchStatsViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
+    """
+    Stats of a channel. Raw snapshots by default, or rollups with ?resolution=5m|1h|1d.
+    Can be bounded with ?from= and ?to= timestamps and is paginated by cursor.
+    """
     queryset = TwitchTrackingProfile.objects.all()
     serializer_class = TwitchStatsSerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+
+    @property
+    def cursor_fields(self):
+        if self.get_resolution() != 'raw':
+            return 'bucket', 'id'
+        return 'created', 'id'
+
+    def get_resolution(self):
+        resolution = self.request.query_params.get('resolution', 'raw')
+        if resolution != 'raw' and resolution not in dict(TwitchStatsRollup.RESOLUTIONS):
+            raise ValidationError({'resolution': 'Must be one of raw, {}.'.format(
+                ', '.join(key for key, name in TwitchStatsRollup.RESOLUTIONS))})
+        return resolution
+
+    def list(self, request, *args, **kwargs):
+        """
+        Serves cached pages keyed by the channel's version and the query, and
+        answers conditional requests with 304 while the channel is unchanged.
+        """
+        version = get_channel_version(self.kwargs['pk'])
+        key = hashlib.md5('{}:{}'.format(version, request.get_full_path()).encode('utf-8')).hexdigest()
+        etag = '"{}"'.format(key)
+        last_modified = int(version)
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_none_match is not None:
+            not_modified = etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        else:
+            not_modified = if_modified_since is not None and if_modified_since >= last_modified
+        if not_modified:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = caches[TWITCH_STATS_CACHE]
+            data = cache.get('twitch_stats:response:{}'.format(key))
+            if data is None:
+                data = super(TwitchStatsViewSet, self).list(request, *args, **kwargs).data
+                cache.set('twitch_stats:response:{}'.format(key), data, TWITCH_STATS_CACHE_TTL)
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_time_range(self):
+        return parse_time_range(self.request.query_params)
 
     def get_queryset(self):
-        return TwitchStats.objects.filter(channel_id=self.kwargs['pk'])
+        resolution = self.get_resolution()
+        if resolution != 'raw':
+            queryset = TwitchStatsRollup.objects.filter(channel_id=self.kwargs['pk'], resolution=resolution)
+        elif TWITCH_STATS_STORAGE == 'delta':
+            queryset = TwitchStatsSample.objects.for_channel(channel_id=self.kwargs['pk'])
+        else:
+            queryset = TwitchStats.objects.filter(channel_id=self.kwargs['pk'])
+
+        time_field = self.cursor_fields[0]
+        start, end = self.get_time_range()
+        if start:
+            queryset = queryset.filter(**{time_field + '__gte': start})
+        if end:
+            queryset = queryset.filter(**{time_field + '__lt': end})
+        return queryset.order_by(*self.cursor_fields)
+
+    def get_serializer_class(self):
+        if self.get_resolution() != 'raw':
+            return TwitchStatsRollupSerializer
+        if TWITCH_STATS_STORAGE == 'delta':
+            return TwitchStatsSampleSerializer
+        return TwitchStatsSerializer
+
+
+class Echo(object):
+    """
+    File-like object that returns written values instead of buffering them.
+    """
+
+    def write(self, value):
+        return value
+
+
+class TwitchStatsExportView(APIView):
+    """
+    Streams the whole stats history of a channel as CSV (default) or NDJSON (?type=ndjson).
+    Can be bounded with ?from= and ?to= timestamps.
+    """
+    throttle_classes = ()
+    permission_classes = (AllowAny,)
+    fields = TwitchStatsSerializer.Meta.fields
+    content_types = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    def get(self, request, pk=None):
+        export_type = request.query_params.get('type', 'csv')
+        if export_type not in self.content_types:
+            return Response({'detail': 'Invalid type.'}, status=status.HTTP_400_BAD_REQUEST)
+        start, end = parse_time_range(request.query_params)
+        rows = TwitchStats.objects.iter_history(channel_id=pk, fields=self.fields, start=start, end=end)
+        lines = self.csv_lines(rows) if export_type == 'csv' else self.ndjson_lines(rows)
+        response = StreamingHttpResponse(lines, content_type=self.content_types[export_type])
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(pk, export_type)
+        return response
+
+    def csv_lines(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.fields)
+        for row in rows:
+            yield writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
+
+    def ndjson_lines(self, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(self.fields, row)), cls=DjangoJSONEncoder) + '\n'
 
 
 class TrackingView(APIView):
@@ -166,7 +345,7 @@ class TrackingView(APIView):
         elif serializer.validated_data['command'] == 'info':
             result = TwitchStats.objects.info_collecting()
             if result:
-                return Response(serializers.serialize('json', [result]), status=status.HTTP_200_OK)
+                return Response(serializers.serialize('json', result), status=status.HTTP_200_OK)
             else:
                 return Response({'detail': 'Task not running.'}, status=status.HTTP_404_NOT_FOUND)
         else:
@@ -1,4 +1,5 @@
 from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from webauth.cache import token_cache
 from webauth.models import AuthToken
 from django.utils.translation import ugettext_lazy as _
 
@@ -30,6 +31,10 @@ class CustomTokenAuthentication(TokenAuthentication):
         return self.authenticate_credentials(token)
 
     def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is not None:
+            return token.user, token
+
         model = self.get_model()
         try:
             token = model.objects.select_related('user').get(key=key)
@@ -42,6 +47,7 @@ class CustomTokenAuthentication(TokenAuthentication):
         if not token.is_valid():
             raise exceptions.AuthenticationFailed(_('Expired token.'))
 
+        token_cache.set(key, token)
         return token.user, token
 
     def authenticate_header(self, request):
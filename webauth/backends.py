@@ -1,5 +1,9 @@
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+
+from webauth.hashing import must_update, run_blocking
 
 UserModel = get_user_model()
 
@@ -9,33 +13,26 @@ class EmailOrUsernameModelBackend(ModelBackend):
     """
 
     def authenticate(self, username=None, password=None, **kwargs):
-        user = self._authenticate_username(username=username, password=password)
-        if user:
-            return user
-        user = self._authenticate_email(email=username, password=password)
-        if user:
-            return user
-        else:
+        if username is None or password is None:
             return None
-
-    def _authenticate_username(self, username=None, password=None):
-        try:
-            user = UserModel.objects.get(username=username)
-        except UserModel.DoesNotExist:
+        user = self._get_user(identifier=username)
+        if user is None:
             # Run the default password hasher once to reduce the timing
             # difference between an existing and a nonexistent user (#20760).
-            UserModel().set_password(password)
-        else:
-            if user.check_password(password) and self.user_can_authenticate(user):
-                return user
+            # Not through set_password(), which also invalidates cached tokens.
+            run_blocking(make_password, password)
+        elif user.check_password(password) and self.user_can_authenticate(user):
+            if must_update(user.password):
+                user.set_password(password)
+                user.save(update_fields=['password'])
+            return user
+        return None
 
-    def _authenticate_email(self, email=None, password=None):
-        try:
-            user = UserModel.objects.get(email=email)
-        except UserModel.DoesNotExist:
-            # Run the default password hasher once to reduce the timing
-            # difference between an existing and a nonexistent user (#20760).
-            UserModel().set_password(password)
-        else:
-            if user.check_password(password) and self.user_can_authenticate(user):
-                return user
+    @staticmethod
+    def _get_user(identifier=None):
+        """
+        Looks the user up by username or email with one query, a username match wins.
+        """
+        users = list(UserModel.objects.filter(Q(username=identifier) | Q(email=identifier))[:2])
+        users.sort(key=lambda user: user.username != identifier)
+        return users[0] if users else None
@@ -0,0 +1,121 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.core.cache import caches
+
+from webauth import settings
+
+Entry = namedtuple('Entry', 'expires checked generation user_id db token_model token_values user_model user_values')
+
+
+class TokenCache(object):
+    """
+    Per-process LRU of validated authentication tokens, so authenticated
+    requests skip the token query for TOKEN_CACHE_TTL seconds. Only the token
+    and the user without its password hash are kept, the hash is loaded from
+    the database on access.
+
+    Saving a user or token drops the local entry and, when TOKEN_CACHE_ALIAS is
+    set, replaces the user's generation in the shared cache. Other processes
+    compare an entry's generation at most every TOKEN_CACHE_REVALIDATE seconds.
+    """
+    prefix = 'webauth:token'
+
+    def __init__(self, ttl=settings.TOKEN_CACHE_TTL, max_size=settings.TOKEN_CACHE_MAX_SIZE,
+                 alias=settings.TOKEN_CACHE_ALIAS, revalidate=settings.TOKEN_CACHE_REVALIDATE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.alias = alias
+        self.revalidate = revalidate
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def generation_key(self, user_id):
+        return '{}:generation:{}'.format(self.prefix, user_id)
+
+    def get(self, key):
+        if not self.ttl:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        if self.shared is not None and now - entry.checked >= self.revalidate:
+            if self.shared.get(self.generation_key(entry.user_id)) != entry.generation:
+                with self._lock:
+                    self._remove(key)
+                return None
+            with self._lock:
+                if key in self._entries:
+                    self._entries[key] = entry._replace(checked=now)
+        return self._load(entry)
+
+    def set(self, key, token):
+        if not self.ttl:
+            return
+        generation = self.shared.get(self.generation_key(token.user_id)) if self.shared is not None else None
+        user = token.user
+        now = time.monotonic()
+        entry = Entry(
+            expires=now + self.ttl, checked=now, generation=generation, user_id=token.user_id, db=token._state.db,
+            token_model=type(token), token_values=self._values(token),
+            user_model=type(user), user_values=self._values(user, exclude=('password',)),
+        )
+        with self._lock:
+            self._remove(key)
+            while len(self._entries) >= self.max_size:
+                self._remove(next(iter(self._entries)))
+            self._entries[key] = entry
+            self._user_keys[token.user_id] = key
+
+    @staticmethod
+    def _values(instance, exclude=()):
+        return OrderedDict((field.attname, getattr(instance, field.attname))
+                           for field in instance._meta.concrete_fields if field.attname not in exclude)
+
+    @staticmethod
+    def _load(entry):
+        """
+        Builds fresh instances for every request, the user's excluded fields are deferred.
+        """
+        user = entry.user_model.from_db(entry.db, list(entry.user_values), list(entry.user_values.values()))
+        token = entry.token_model.from_db(entry.db, list(entry.token_values), list(entry.token_values.values()))
+        token.user = user
+        return token
+
+    def _remove(self, key):
+        """
+        Drops an entry and its user mapping, the caller holds the lock.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None and self._user_keys.get(entry.user_id) == key:
+            del self._user_keys[entry.user_id]
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            key = self._user_keys.get(user_id)
+            if key is not None:
+                self._remove(key)
+        if self.shared is not None and user_id is not None:
+            # Outlives every entry cached before the change.
+            self.shared.set(self.generation_key(user_id), uuid.uuid4().hex, timeout=self.ttl * 2)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+
+token_cache = TokenCache()
@@ -0,0 +1,20 @@
+from django.contrib.auth.hashers import Argon2PasswordHasher, BCryptSHA256PasswordHasher
+
+from webauth import settings
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2 with the cost parameters from webauth settings. Hashes made with
+    other parameters are upgraded on the next successful login.
+    """
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class TunedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    """
+    BCrypt with the work factor from webauth settings.
+    """
+    rounds = settings.BCRYPT_ROUNDS
@@ -0,0 +1,27 @@
+import sys
+
+from django.contrib.auth.hashers import get_hasher, identify_hasher
+
+
+def run_blocking(func, *args, **kwargs):
+    """
+    Runs a CPU bound function in a real thread when the process is patched by
+    gevent, so hashing a password doesn't stall every other greenlet.
+    """
+    if 'gevent' in sys.modules:
+        from gevent import get_hub, monkey
+        if monkey.is_module_patched('threading'):
+            return get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
+
+
+def must_update(encoded):
+    """
+    Returns True when a stored hash doesn't use the preferred hasher or its current cost.
+    """
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    preferred = get_hasher('default')
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
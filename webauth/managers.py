@@ -63,24 +63,28 @@ class CustomUserManager(BaseUserManager):
 class CustomTokenManager(models.Manager):
     def get_or_create_or_update(self, **kwargs):
         user = kwargs.pop('user')
+        key = self.make_key(user=user)
         try:
             token = self.get(user=user)
         except self.model.DoesNotExist:
-            token = self.create(user=user)
-        is_valid, key = self.validate_key(token=token)
-        if not is_valid:
+            return self.create(user=user, key=key)
+        token.user = user
+        if token.key != key:
             token.key = key
-            token.save(using=self._db)
-        else:
-            token.save(using=self._db)
+            token.save(using=self._db, update_fields=['key', 'updated'])
         return token
 
     @staticmethod
-    def validate_key(token):
-        valid_key = hashlib.sha256()
-        valid_key.update(token.user.password.encode('utf-8'))
-        valid_key.update(str(token.user.last_login.timestamp()).encode('utf-8'))
-        return valid_key.hexdigest() == token.key, valid_key.hexdigest()
+    def make_key(user):
+        key = hashlib.sha256()
+        key.update(user.password.encode('utf-8'))
+        key.update(str(user.last_login.timestamp()).encode('utf-8'))
+        return key.hexdigest()
+
+    @classmethod
+    def validate_key(cls, token):
+        valid_key = cls.make_key(user=token.user)
+        return valid_key == token.key, valid_key
 
 
 class ConfirmManager(models.Manager):
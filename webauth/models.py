@@ -1,12 +1,15 @@
 import uuid
 import hashlib
 
+from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.models import AbstractBaseUser
 from django.core.validators import MinLengthValidator, MaxLengthValidator
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
 from hoffpw import settings
+from webauth.cache import token_cache
+from webauth.hashing import run_blocking
 from webauth.managers import CustomUserManager, CustomTokenManager, ConfirmManager
 
 
@@ -36,6 +39,20 @@ class User(AbstractBaseUser):
     def is_admin(self):
         return self.is_staff or self.is_superuser
 
+    def set_password(self, raw_password):
+        self.password = run_blocking(make_password, raw_password)
+        self._password = raw_password
+        token_cache.invalidate_user(self.pk)
+
+    def check_password(self, raw_password):
+        # Outdated hashes are upgraded by webauth.backends after a successful login.
+        return run_blocking(check_password, raw_password, self.password)
+
+    def save(self, *args, **kwargs):
+        # Tokens are derived from the password and last login, and check is_active.
+        token_cache.invalidate_user(self.pk)
+        return super(User, self).save(*args, **kwargs)
+
     class Meta:
         ordering = ('date_joined',)
 
@@ -95,6 +112,7 @@ class AuthToken(models.Model):
     def save(self, *args, **kwargs):
         if not self.key:
             self.key = self.generate_key()
+        token_cache.invalidate_user(self.user_id)
         return super(AuthToken, self).save(*args, **kwargs)
 
     def generate_key(self):
@@ -3,3 +3,29 @@
 """
 VERIFICATION_KEY_EXPIRATION_HOURS = 24
 
+"""
+    Seconds a validated authentication token is cached in process memory, 0 disables the cache.
+"""
+TOKEN_CACHE_TTL = 30
+TOKEN_CACHE_MAX_SIZE = 10000
+
+"""
+    Django cache alias shared between processes that holds a generation per user, replaced
+    whenever the user or its token is saved. None only invalidates the saving process.
+    hoffpw.checks refuses process-local backends.
+"""
+TOKEN_CACHE_ALIAS = 'default'
+
+"""
+    Seconds a cached token is trusted before its generation is compared again, the
+    longest another process accepts a revoked token. 0 compares on every request.
+"""
+TOKEN_CACHE_REVALIDATE = 5
+
+"""
+    Cost parameters of the password hashers in webauth.hashers.
+"""
+ARGON2_TIME_COST = 2
+ARGON2_MEMORY_COST = 8192
+ARGON2_PARALLELISM = 1
+BCRYPT_ROUNDS = 12
@@ -1,13 +1,24 @@
-from uuid import UUID
-
+import time
+from unittest import mock
+from uuid import UUID, uuid4
+
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APITestCase
+from webauth.backends import EmailOrUsernameModelBackend
+from webauth.cache import TokenCache, token_cache
 from webauth.models import User, AuthToken
 
 
 # Create your tests here.
 
 class AccountTests(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+
     def test_create_account(self):
         """
         Ensure we can create a new user object.
@@ -81,6 +92,72 @@ class AccountTests(APITestCase):
         self.assertEqual(AuthToken.objects.get().key, self.token)
         self.assertEqual(AuthToken.objects.get().user_id, User.objects.get().uuid)
 
+    def test_authenticate_email(self):
+        """
+        Ensure we can authenticate with the email of the created user.
+        """
+        self.test_create_account()
+        url = '/auth/login/'
+        data = {'username': 'test@email.com', 'password': 'test_password'}
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(AuthToken.objects.get().key, response.data['token'])
+
+    def test_authenticate_wrong_password(self):
+        """
+        Ensure we can't authenticate with a wrong password.
+        """
+        self.test_create_account()
+        url = '/auth/login/'
+        data = {'username': 'test@email.com', 'password': 'wrong_password'}
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def assert_login_cost(self, username, password):
+        """
+        Authenticates with the backend and checks it costs one query and one hash.
+        """
+        hasher = get_hasher('default')
+        with mock.patch.object(hasher, 'encode', wraps=hasher.encode) as encode, \
+                mock.patch.object(hasher, 'verify', wraps=hasher.verify) as verify, \
+                mock.patch('webauth.models.token_cache.invalidate_user') as invalidate_user, \
+                self.assertNumQueries(1):
+            user = EmailOrUsernameModelBackend().authenticate(username=username, password=password)
+        self.assertEqual(encode.call_count + verify.call_count, 1)
+        self.assertFalse(invalidate_user.called)
+        return user
+
+    def test_authenticate_cost(self):
+        """
+        Ensure every login attempt costs one query and one hash, for known and unknown users alike.
+        """
+        self.test_create_account()
+        self.assertIsNotNone(self.assert_login_cost('test@email.com', 'test_password'))
+        self.assertIsNone(self.assert_login_cost('test_user', 'wrong_password'))
+        self.assertIsNone(self.assert_login_cost('nobody', 'test_password'))
+
+    def test_authenticate_upgrades_hash(self):
+        """
+        Ensure a password hashed with an older hasher is upgraded on login.
+        """
+        self.test_create_account()
+        User.objects.filter().update(password=make_password('test_password', hasher='pbkdf2_sha256'))
+        url = '/auth/login/'
+        data = {'username': 'test_user', 'password': 'test_password'}
+        response = self.client.post(url, data=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(User.objects.get().password.startswith('argon2$'))
+
+    def test_token_unchanged_not_saved(self):
+        """
+        Ensure fetching an unchanged token does not write it again.
+        """
+        self.test_authenticate()
+        user = User.objects.get()
+        with self.assertNumQueries(1):
+            token = AuthToken.objects.get_or_create_or_update(user=user)
+        self.assertEqual(token.key, self.token)
+
     def test_deauthenticate(self):
         """
         Ensure we can de-authenticate our authorization token.
@@ -94,6 +171,22 @@ class AccountTests(APITestCase):
         self.assertEqual(AuthToken.objects.count(), 1)
         self.assertEqual(AuthToken.objects.get().key, '0')
 
+    def test_cached_token_authentication(self):
+        """
+        Ensure a cached token skips the token query and is dropped on logout.
+        """
+        self.test_authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        self.client.get('/users/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/users/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries.captured_queries if 'webauth_authtoken' in query['sql']])
+        response = self.client.post('/auth/logout/', data={})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get('/users/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_get_users_anonymous(self):
         url = '/users/'
         response = self.client.get(url)
@@ -288,4 +381,62 @@ class AccountTests(APITestCase):
         self.assertGreater(User.objects.count(), count)
 
 
+class TokenCacheTests(TestCase):
+    @staticmethod
+    def make_token(key):
+        return AuthToken(key=key, user=User(uuid=uuid4(), username='user' + key, password='secret_hash'))
 
+    def test_local_lru(self):
+        """
+        Ensure the process-local cache evicts the least recently used token and forgets its user.
+        """
+        cache = TokenCache(ttl=30, max_size=2, alias=None)
+        tokens = [self.make_token(str(index)) for index in range(3)]
+        cache.set('0', tokens[0])
+        cache.set('1', tokens[1])
+        self.assertEqual(cache.get('0').user_id, tokens[0].user_id)
+        cache.set('2', tokens[2])
+        self.assertIsNone(cache.get('1'))
+        self.assertEqual(cache.get('0').key, '0')
+        self.assertEqual(set(cache._user_keys), {tokens[0].user_id, tokens[2].user_id})
+        cache.invalidate_user(tokens[0].user_id)
+        self.assertIsNone(cache.get('0'))
+        self.assertEqual(list(cache._user_keys), [tokens[2].user_id])
+
+    def test_local_expiry(self):
+        """
+        Ensure an expired token is dropped together with its user mapping.
+        """
+        cache = TokenCache(ttl=30, max_size=2, alias=None)
+        with mock.patch('webauth.cache.time.monotonic', return_value=0):
+            cache.set('0', self.make_token('0'))
+        with mock.patch('webauth.cache.time.monotonic', return_value=31):
+            self.assertIsNone(cache.get('0'))
+        self.assertEqual(cache._user_keys, {})
+
+    def test_password_not_cached(self):
+        """
+        Ensure cached users do not hold the password hash.
+        """
+        cache = TokenCache(ttl=30, max_size=2, alias=None)
+        token = self.make_token('0')
+        cache.set('0', token)
+        cached = cache.get('0')
+        self.assertEqual(cached.user.username, 'user0')
+        self.assertNotIn('password', cached.user.__dict__)
+        self.assertNotIn('secret_hash', repr(list(cache._entries.values())))
+
+    def test_shared_invalidation(self):
+        """
+        Ensure invalidating a user in one process drops its token in the others once revalidated.
+        """
+        first, second = [TokenCache(ttl=30, max_size=2, alias='default', revalidate=5) for _ in range(2)]
+        token = self.make_token('0')
+        first.set('0', token)
+        second.set('0', token)
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(second.get('0'))
+        first.invalidate_user(token.user_id)
+        self.assertIsNone(first.get('0'))
+        with mock.patch('webauth.cache.time.monotonic', return_value=time.monotonic() + 5):
+            self.assertIsNone(second.get('0'))
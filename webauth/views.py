@@ -170,7 +170,7 @@ class ObtainToken(APIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        user.save()
+        user.save(update_fields=['last_login'])
         token = AuthToken.objects.get_or_create_or_update(user=user)
         return Response({'token': token.key})
 